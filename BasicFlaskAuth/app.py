@@ -1,15 +1,20 @@
+import os
 from flask import Flask, request, abort
-import json
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from jwks import JWKSKeyStore
 
 
 app = Flask(__name__)
 
-AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', '@TODO_REPLACE_WITH_YOUR_DOMAIN')
 ALGORITHMS = ['RS256']
-API_AUDIENCE = @TODO_REPLACE_WITH_YOUR_API_AUDIENCE
+API_AUDIENCE = os.environ.get('API_AUDIENCE', '@TODO_REPLACE_WITH_YOUR_API_AUDIENCE')
+JWKS_URL = os.environ.get('JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+# parsed signing keys by kid, refreshed in the background
+jwks = JWKSKeyStore(JWKS_URL, algorithm=ALGORITHMS[0])
 
 
 class AuthError(Exception):
@@ -52,26 +57,15 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
-    if rsa_key:
+    rsa_key = jwks.get(unverified_header['kid'])
+    if rsa_key is not None:
         try:
             payload = jwt.decode(
                 token,
@@ -0,0 +1,58 @@
+"""Times verify_decode_jwt against a local JWKS endpoint.
+
+    python benchmark.py
+
+"before" downloads and parses the key set on every call, as
+verify_decode_jwt used to. "after" goes through the cached key store.
+"""
+import argparse
+import json
+import time
+from urllib.request import urlopen
+
+from jose import jwt
+
+import app as auth_app
+from jwks import JWKSKeyStore
+from test_app import JWKSStandIn, make_key
+
+
+def verify_with_fetch(token, url):
+    jwks = json.loads(urlopen(url).read())
+    kid = jwt.get_unverified_header(token)['kid']
+    rsa_key = next(key for key in jwks['keys'] if key['kid'] == kid)
+    return jwt.decode(token, rsa_key, algorithms=auth_app.ALGORITHMS,
+                      audience=auth_app.API_AUDIENCE, issuer='https://' + auth_app.AUTH0_DOMAIN + '/')
+
+
+def timed(verify, token, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        verify(token)
+    return (time.perf_counter() - started) / repeat
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark token verification.')
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    server = JWKSStandIn()
+    pem, public = make_key('bench')
+    server.jwks = {'keys': [public]}
+    auth_app.jwks = JWKSKeyStore(server.url)
+    token = jwt.encode({
+        'iss': 'https://' + auth_app.AUTH0_DOMAIN + '/',
+        'aud': auth_app.API_AUDIENCE,
+        'exp': int(time.time()) + 3600
+    }, pem, algorithm='RS256', headers={'kid': 'bench'})
+
+    before = timed(lambda t: verify_with_fetch(t, server.url), token, args.repeat)
+    server.requests = 0
+    auth_app.verify_decode_jwt(token)
+    after = timed(auth_app.verify_decode_jwt, token, args.repeat)
+
+    print('before {:8.3f} ms/request'.format(before * 1000))
+    print('after  {:8.3f} ms/request, {} JWKS fetches for {} requests'.format(
+        after * 1000, server.requests, args.repeat + 1))
+    server.shutdown()
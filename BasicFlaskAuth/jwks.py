@@ -0,0 +1,98 @@
+import json
+import re
+import threading
+import time
+from urllib.request import urlopen
+
+from jose import jwk
+
+
+class JWKSKeyStore:
+    """Caches the RSA keys of a JWKS endpoint, keyed by kid.
+
+    Keys are parsed once per fetch. A daemon thread refetches the set
+    shortly before it expires, so verifying a token does no I/O. An
+    unknown kid (e.g. after a key rotation) triggers one synchronous
+    refetch. Neither path fetches more than once every
+    `min_refetch_interval` seconds, whatever max-age the endpoint sends
+    and whether or not the last attempt succeeded.
+    """
+
+    def __init__(self, url, algorithm='RS256', ttl=3600, refresh_margin=300,
+                 min_refetch_interval=30, timeout=5):
+        self.url = url
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+
+        self.keys = {}
+        self.expires_at = 0
+        self.refresh_at = 0
+        self.fetched_at = None
+        self.attempted_at = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.refresher = None
+
+    def fetch(self):
+        """Downloads and parses the key set, replacing the cached keys."""
+        self.attempted_at = time.monotonic()
+        response = urlopen(self.url, timeout=self.timeout)
+        jwks = json.loads(response.read())
+        max_age = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+
+        keys = {}
+        for key in jwks.get('keys', []):
+            if key.get('kty') == 'RSA' and key.get('use', 'sig') == 'sig' and 'kid' in key:
+                keys[key['kid']] = jwk.construct(key, self.algorithm)
+
+        self.keys = keys
+        self.fetched_at = time.monotonic()
+        lifetime = int(max_age.group(1)) if max_age else self.ttl
+        self.expires_at = self.fetched_at + lifetime
+        # a short max-age (0 is common) must not turn into a refetch every second
+        margin = min(self.refresh_margin, lifetime / 2)
+        self.refresh_at = self.fetched_at + max(lifetime - margin, self.min_refetch_interval)
+
+    def get(self, kid):
+        """Returns the parsed key for kid, or None if the endpoint does not have it."""
+        key = self.keys.get(kid)
+        if key is not None:
+            return key
+
+        with self.lock:
+            key = self.keys.get(kid)
+            # counted from the last attempt, so a down endpoint is not retried for every bogus kid
+            if key is None and (self.attempted_at is None or
+                                time.monotonic() - self.attempted_at >= self.min_refetch_interval):
+                self.fetch()
+                key = self.keys.get(kid)
+        self.start()
+        return key
+
+    def start(self):
+        """Starts the background refresher if it is not running yet."""
+        if self.refresher is None or not self.refresher.is_alive():
+            with self.lock:
+                if self.refresher is None or not self.refresher.is_alive():
+                    self.stopped.clear()
+                    self.refresher = threading.Thread(target=self.refresh_loop, daemon=True)
+                    self.refresher.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def refresh_loop(self):
+        while not self.stopped.is_set():
+            delay = self.refresh_at - time.monotonic()
+            if self.stopped.wait(max(delay, 1)):
+                return
+            if time.monotonic() >= self.refresh_at:
+                try:
+                    with self.lock:
+                        self.fetch()
+                except Exception:
+                    # keep serving the keys we have and try again shortly
+                    self.refresh_at = time.monotonic() + self.min_refetch_interval
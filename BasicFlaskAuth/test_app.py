@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Crypto.PublicKey import RSA
+from jose import jwk, jwt
+
+import app as auth_app
+from jwks import JWKSKeyStore
+
+
+def make_key(kid):
+    key = jwk.construct(RSA.generate(2048).export_key(), 'RS256')
+    public = key.public_key().to_dict()
+    public.update({'kid': kid, 'use': 'sig'})
+    return key.to_pem(), public
+
+
+class JWKSStandIn(ThreadingHTTPServer):
+    """Serves whatever keys are in self.jwks and counts the requests"""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), JWKSHandler)
+        self.jwks = {'keys': []}
+        self.max_age = 3600
+        self.status = 200
+        self.requests = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/.well-known/jwks.json'.format(self.server_address[1])
+
+
+class JWKSHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.status != 200:
+            self.send_error(self.server.status)
+            return
+        body = json.dumps(self.server.jwks).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'public, max-age={}'.format(self.server.max_age))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class JWKSKeyStoreTestCase(unittest.TestCase):
+    """This class represents the jwks key store test case"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.first_pem, cls.first_public = make_key('first')
+        cls.second_pem, cls.second_public = make_key('second')
+
+    def setUp(self):
+        """Define test variables and start a local JWKS endpoint."""
+        self.server = JWKSStandIn()
+        self.server.jwks = {'keys': [self.first_public]}
+        self.store = JWKSKeyStore(self.server.url, min_refetch_interval=30)
+        auth_app.jwks = self.store
+        self.client = auth_app.app.test_client
+
+    def tearDown(self):
+        """Executed after reach test"""
+        self.store.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def token(self, pem, kid, **claims):
+        payload = {
+            'iss': 'https://' + auth_app.AUTH0_DOMAIN + '/',
+            'aud': auth_app.API_AUDIENCE,
+            'exp': int(time.time()) + 600,
+            'sub': 'user'
+        }
+        payload.update(claims)
+        return jwt.encode(payload, pem, algorithm='RS256', headers={'kid': kid})
+
+    def test_verified_requests_fetch_keys_once(self):
+        token = self.token(self.first_pem, 'first')
+
+        for _ in range(5):
+            self.assertEqual(auth_app.verify_decode_jwt(token)['sub'], 'user')
+
+        self.assertEqual(self.server.requests, 1)
+
+    def test_unknown_kid_refetches_once(self):
+        auth_app.verify_decode_jwt(self.token(self.first_pem, 'first'))
+        self.store.min_refetch_interval = 0
+        self.server.jwks = {'keys': [self.first_public, self.second_public]}
+
+        payload = auth_app.verify_decode_jwt(self.token(self.second_pem, 'second'))
+
+        self.assertEqual(payload['sub'], 'user')
+        self.assertEqual(self.server.requests, 2)
+
+    def test_unknown_kid_refetch_is_rate_limited(self):
+        token = self.token(self.second_pem, 'second')
+
+        for _ in range(3):
+            with self.assertRaises(auth_app.AuthError):
+                auth_app.verify_decode_jwt(token)
+
+        self.assertEqual(self.server.requests, 1)
+
+    def test_keys_refresh_in_background(self):
+        self.server.max_age = 2
+        self.store.refresh_margin = 1
+        self.store.min_refetch_interval = 1
+        self.store.get('first')
+        self.server.jwks = {'keys': [self.second_public]}
+
+        deadline = time.time() + 5
+        while self.store.keys.get('second') is None and time.time() < deadline:
+            time.sleep(0.1)
+
+        self.assertIsNotNone(self.store.keys.get('second'))
+        self.assertGreaterEqual(self.server.requests, 2)
+
+    def test_unknown_kid_refetch_is_rate_limited_while_endpoint_is_down(self):
+        self.server.status = 503
+
+        with self.assertRaises(Exception):
+            self.store.get('first')
+        for kid in ('second', 'third', 'fourth'):
+            self.assertIsNone(self.store.get(kid))
+
+        self.assertEqual(self.server.requests, 1)
+
+    def test_zero_max_age_does_not_refetch_every_second(self):
+        self.server.max_age = 0
+        self.store.get('first')
+
+        time.sleep(2.5)
+
+        self.assertEqual(self.server.requests, 1)
+        self.assertIsNotNone(self.store.keys.get('first'))
+
+    def test_short_max_age_refreshes_before_expiry(self):
+        self.server.max_age = 4
+        self.store.min_refetch_interval = 1
+        self.store.get('first')
+
+        # the 300s default margin is capped at half of max-age
+        self.assertAlmostEqual(self.store.refresh_at - self.store.fetched_at, 2, places=3)
+
+    def test_headers_route(self):
+        token = self.token(self.first_pem, 'first')
+
+        res = self.client().get('/headers', headers={'Authorization': 'Bearer ' + token})
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().get('/headers', headers={'Authorization': 'Bearer ' + token + 'x'})
+        self.assertEqual(res.status_code, 401)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
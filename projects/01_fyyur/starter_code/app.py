@@ -2,18 +2,34 @@
 # Imports.
 #--------------------------------------------------------------
 
+import io
 import json
+from datetime import timedelta
+from functools import lru_cache
+from itertools import groupby
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+import click
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, stream_with_context
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
+from sqlalchemy import tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+import atexit
 from flask_wtf import Form
 from flask_wtf.csrf import CSRFProtect
 from forms import *
+from search import ModelSearch
+from facets import GenreFacets
+from availability import ShowCalendar
+from cache import ResponseCache, make_backend
+from profiler import SQLProfiler
+from showcounts import ShowCounters
+from logqueue import init_logging
+import importer
 
 #-------------------------------------------------------------
 # App Config.
@@ -25,6 +41,16 @@ app.config.from_object('config')
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 csrf = CSRFProtect(app)
+response_cache = ResponseCache(
+  make_backend(app.config['RESPONSE_CACHE'], app.config['RESPONSE_CACHE_SIZE']),
+  ttl=app.config['RESPONSE_CACHE_TTL']
+)
+sql_profiler = SQLProfiler(app.config['SQL_PROFILER_REPEAT_THRESHOLD'])
+if app.config['SQL_PROFILER']:
+  sql_profiler.init_app(app, db.engine)
+
+SHOWS_PER_PAGE = 60
+ARTISTS_PER_PAGE = 100
 
 # TODO: connect to a local postgresql database DONE 
 
@@ -34,16 +60,30 @@ csrf = CSRFProtect(app)
 
 class Shows(db.Model):
   __tablename__ = 'shows'
+  # every upcoming/past lookup filters one venue or artist by start_time,
+  # the show count sweep reads the shows that started since its last run
+  __table_args__ = (
+    db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_shows_start_time', 'start_time'),
+  )
   id = db.Column(db.Integer, primary_key=True)
   venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
   start_time = db.Column(db.DateTime, nullable=False)
+  # the venue is booked for [start_time, start_time + duration), see availability.py
+  duration_minutes = db.Column(db.Integer, nullable=False, default=120, server_default='120')
 
   def __repr__(self):
     return f'<Show ID: {self.id}, Venue ID: {self.venue_id}, Artist ID:{self.artist_id}>'
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    # genre facet filters (genres @> ARRAY[...]) and the area filter
+    __table_args__ = (
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venue_state_city', 'state', 'city'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -51,13 +91,16 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(postgresql.ARRAY(db.String(120)).with_variant(db.JSON, 'sqlite'))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False, default = False)
     seeking_description = db.Column(db.String(), nullable=False)
-    shows = db.relationship('Shows', backref='venue', lazy="joined") #venue is parent and shows are child
+    # kept by show_counters, see showcounts.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship('Shows', backref='venue') #venue is parent and shows are child. loaded per endpoint, never eagerly
 
     def __repr__(self):
       return f'<Venue ID: {self.id}, name: {self.name}>'
@@ -65,45 +108,93 @@ class Venue(db.Model):
     
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    # genre facet filters, and an area browse that pages through ids
+    __table_args__ = (
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_state_city_id', 'state', 'city', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(postgresql.ARRAY(db.String(120)).with_variant(db.JSON, 'sqlite'))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default = False)
     seeking_description = db.Column(db.String(), nullable=False)
-    shows = db.relationship('Shows', backref='artist', lazy="joined") #artist is parent and shows are child
+    # kept by show_counters, see showcounts.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship('Shows', backref='artist') #artist is parent and shows are child. loaded per endpoint, never eagerly
 
     def __repr__(self):
       return f'<Artist ID: {self.id}, name: {self.name}>'
     # TODO: implement any missing fields, as a database migration using Flask-Migrate DONE
 
+class ShowCountSweep(db.Model):
+  # one row: shows starting at or before swept_until are counted as past
+  __tablename__ = 'show_count_sweep'
+  id = db.Column(db.Integer, primary_key=True)
+  swept_until = db.Column(db.DateTime, nullable=False)
+
+class GenreCount(db.Model):
+  # venues or artists per genre in each area, kept by venue_facets and artist_facets
+  __tablename__ = 'genre_counts'
+  kind = db.Column(db.String(20), primary_key=True)
+  state = db.Column(db.String(120), primary_key=True)
+  city = db.Column(db.String(120), primary_key=True)
+  genre = db.Column(db.String(120), primary_key=True)
+  count = db.Column(db.Integer, nullable=False, default=0)
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration. DONE
 
+venue_search = ModelSearch(db, Venue)
+artist_search = ModelSearch(db, Artist)
+show_counters = ShowCounters(db, Shows, Venue, Artist, ShowCountSweep)
+venue_facets = GenreFacets(db, Venue, GenreCount, ttl=app.config['GENRE_FACET_TTL'])
+artist_facets = GenreFacets(db, Artist, GenreCount, ttl=app.config['GENRE_FACET_TTL'])
+show_calendar = ShowCalendar(db, Shows, Venue)
+
 #------------------------------------------------------------------
 # Filters.
 #------------------------------------------------------------------
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=64)
+def datetime_pattern(format, locale):
+  # parsing the pattern and the locale is most of babel's work, do it once per pair
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # views pass datetime objects, strings are still parsed for older callers
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+def stream_template(template_name, **context):
+  # renders the template lazily so large listings are sent in chunks
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+  stream = template.stream(context)
+  stream.enable_buffering(5)
+  return stream
+
 # -----------------------------------------------------------------
 # Controllers.
 # -----------------------------------------------------------------
 
 @app.route('/')
+@response_cache.cached('home')
 def index():
   return render_template('pages/home.html')
 
@@ -111,34 +202,49 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
+def facet_args(args):
+  # ?genre=Jazz&genre=Blues&state=CA&city=San Francisco, every genre must match
+  return args.getlist('genre'), args.get('state') or None, args.get('city') or None
+
+def venue_areas(genres=(), state=None, city=None):
+  # one ordered query returns every venue with its stored upcoming show count, sorted
+  # by state and city so each area is a contiguous run that groupby can fold
+  venue_query = db.session.query(
+      Venue.id,
+      Venue.name,
+      Venue.city,
+      Venue.state,
+      Venue.upcoming_shows_count.label('num_upcoming_shows')
+    )
+  if state:
+    venue_query = venue_query.filter(Venue.state == state)
+  if city:
+    venue_query = venue_query.filter(Venue.city == city)
+  venue_query = venue_facets.filter(venue_query, genres).\
+    order_by(Venue.state, Venue.city, Venue.name, Venue.id).\
+    all()
+
+  return [{
+    "city": city,
+    "state": state,
+    "venues": [{
+      "id": venue.id,
+      "name": venue.name,
+      "num_upcoming_shows": venue.num_upcoming_shows
+    } for venue in area_venues]
+  } for (state, city), area_venues in groupby(venue_query, key=lambda venue: (venue.state, venue.city))]
+
 @app.route('/venues')
+@response_cache.cached('venues')
 def venues():
   # TODO: replace with real venues data. 
   #       num_shows should be aggregated based on number of upcoming shows per venue.
   
-  current_time = datetime.now().strftime('%Y-%m-%d%H:%M:%S')
-  data = []
-  city_and_state = ''
-  venue_query = Venue.query.group_by(Venue.id, Venue.state, Venue.city).all()
-
-  for venue in venue_query:
-    if city_and_state == venue.city + venue.state:
-      data[len(data)-1]["venues"].append({
-        "id": venue.id,
-        "name": venue.name,
-      })
-    else:
-      city_and_state = venue.city + venue.state
-      data.append({
-        "city": venue.city,
-        "state": venue.state,
-        "venues": [{
-          "id": venue.id,
-          "name": venue.name,
-        }]
-      })
+  genres, state, city = facet_args(request.args)
+  data = venue_areas(genres, state, city)
   
-  return render_template('pages/venues.html', areas=data)
+  return render_template('pages/venues.html', areas=data, facets=venue_facets.counts(state, city),
+                         genres=genres, state=state, city=city)
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
@@ -146,47 +252,70 @@ def search_venues():
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
   
-  current_time = datetime.now()
+  # upcoming show counts are read from the venue row, shows are not touched.
+  # matches on name, city or genre, most relevant first (see search.py)
+  # genre facet counts are taken from the matches themselves
   search = request.form.get('search_term', '')
-  venues = Venue.query.filter(Venue.name.ilike("%"+ search + "%")).all()
-  data = []
+  genres = request.form.getlist('genre')
+  venue_query = db.session.query(
+      Venue.id,
+      Venue.name,
+      Venue.genres,
+      Venue.upcoming_shows_count.label('num_upcoming_shows')
+    )
+  venues = venue_search.search(venue_facets.filter(venue_query, genres), search)
 
-  for venue in venues:
-    count = Shows.query.filter_by(venue_id = venue.id).filter(Shows.start_time > current_time).count()
-    data.append({
+  response = {
+    "count": len(venues),
+    "data": [{
       "id": venue.id,
       "name": venue.name,
-      "num_upcoming_shows": count
-    })
-    response = {
-      "count": len(venues),
-      "data": data
-    }
+      "num_upcoming_shows": venue.num_upcoming_shows
+    } for venue in venues],
+    "facets": venue_facets.count_rows(venues)
+  }
 
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''),
+                         genres=genres)
 
 @app.route('/venues/<int:venue_id>')
+@response_cache.cached('venue', 'venue_id')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id DONE
   
-  past_shows = db.session.query(Artist, Shows).join(Shows).join(Venue).\
-    filter(
-      Shows.venue_id == venue_id,
-      Shows.artist_id == Artist.id,
-      Shows.start_time < datetime.now()
+  # the venue, its shows and their artists come back in one outer joined query,
+  # then get split into past and upcoming against a single captured now
+  now = datetime.now()
+  rows = db.session.query(
+      Venue,
+      Shows.start_time,
+      Artist.id.label('artist_id'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
     ).\
+    outerjoin(Shows, Shows.venue_id == Venue.id).\
+    outerjoin(Artist, Artist.id == Shows.artist_id).\
+    filter(Venue.id == venue_id).\
+    order_by(Shows.start_time).\
     all()
 
-  upcoming_shows = db.session.query(Artist, Shows).join(Shows).join(Venue).\
-    filter(
-      Shows.venue_id == venue_id,
-      Shows.artist_id == Artist.id,
-      Shows.start_time > datetime.now()
-    ).\
-    all()
-
-  venue = Venue.query.filter_by(id=venue_id).first_or_404()
+  if not rows:
+    abort(404)
+
+  venue = rows[0].Venue
+  past_shows = []
+  upcoming_shows = []
+  for row in rows:
+    if row.start_time is None:
+      continue
+    show_list = past_shows if row.start_time < now else upcoming_shows
+    show_list.append({
+      'artist_id': row.artist_id,
+      'artist_name': row.artist_name,
+      'artist_image_link': row.artist_image_link,
+      'start_time': row.start_time
+    })
 
   data = {
     'id': venue.id,
@@ -201,24 +330,51 @@ def show_venue(venue_id):
     "seeking_talent": venue.seeking_talent,
     "seeking_description": venue.seeking_description,
     "image_link": venue.image_link,
-    'past_shows': [{
-      'artist_id': artist.id,
-      "artist_name": artist.name,
-      "artist_image_link": artist.image_link,
-      "start_time": show.start_time.strftime("%m/%d/%Y, %H:%M")
-    } for artist, show in past_shows],
-    'upcoming_shows': [{
-      'artist_id': artist.id,
-      'artist_name': artist.name,
-      'artist_image_link': artist.image_link,
-      'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-    } for artist, show in upcoming_shows],
-      'past_shows_count': len(past_shows),
-      'upcoming_shows_count': len(upcoming_shows)
+    'past_shows': past_shows,
+    'upcoming_shows': upcoming_shows,
+    'past_shows_count': len(past_shows),
+    'upcoming_shows_count': len(upcoming_shows)
   }
 
   return render_template('pages/show_venue.html', venue=data)
 
+@app.route('/venues/available')
+def available_venues():
+  # venues free for the whole of [start, end), optionally in one city and state.
+  # ?start=2026-11-01T20:00&end=2026-11-01T23:00, or ?duration=<minutes> instead of end
+  data = None
+  city = request.args.get('city') or None
+  state = request.args.get('state') or None
+  start = request.args.get('start')
+  end = request.args.get('end')
+  if start:
+    try:
+      start = datetime.fromisoformat(start)
+      if end:
+        end = datetime.fromisoformat(end)
+      else:
+        end = start + timedelta(minutes=request.args.get('duration', 120, type=int))
+    except ValueError:
+      abort(400)
+    if end <= start:
+      abort(400)
+
+    venue_query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state)
+    if city:
+      venue_query = venue_query.filter(Venue.city == city)
+    if state:
+      venue_query = venue_query.filter(Venue.state == state)
+    venues = show_calendar.available(venue_query.order_by(Venue.name, Venue.id), start, end)
+    data = [{
+      "id": venue.id,
+      "name": venue.name,
+      "city": venue.city,
+      "state": venue.state
+    } for venue in venues]
+
+  return render_template('pages/available_venues.html', venues=data, city=city, state=state,
+                         start=start, end=end)
+
 #  ----------------------------------------------------------------
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -249,6 +405,7 @@ def create_venue_submission():
       )    
       db.session.add(venue)
       db.session.commit()
+      response_cache.evict('venues')
       flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except():
       db.session.rollback()
@@ -284,11 +441,31 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 @app.route('/artists')
+@response_cache.cached('artists')
 def artists():
   # TODO: replace with real data returned from querying the database DONE
   
   data = []
-  artist_query = Artist.query.all()
+  # list pages only need these columns, no Artist objects or shows
+  artist_query = db.session.query(Artist.id, Artist.name)
+
+  # a genre or area browse can match many thousands of artists, so it is
+  # keyset paginated on id with ?after=<id>
+  genres, state, city = facet_args(request.args)
+  next_cursor = None
+  if genres or state or city:
+    if state:
+      artist_query = artist_query.filter(Artist.state == state)
+    if city:
+      artist_query = artist_query.filter(Artist.city == city)
+    artist_query = artist_facets.filter(artist_query, genres).order_by(Artist.id)
+    after = request.args.get('after', type=int)
+    if after:
+      artist_query = artist_query.filter(Artist.id > after)
+    artist_query = artist_query.limit(ARTISTS_PER_PAGE + 1).all()
+    if len(artist_query) > ARTISTS_PER_PAGE:
+      artist_query = artist_query[:ARTISTS_PER_PAGE]
+      next_cursor = artist_query[-1].id
 
   for artist in artist_query:
     data.append({
@@ -296,7 +473,8 @@ def artists():
         "name": artist.name,
       })
   
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data, facets=artist_facets.counts(state, city),
+                         genres=genres, state=state, city=city, next_cursor=next_cursor)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
@@ -304,47 +482,70 @@ def search_artists():
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
   
-  current_time = datetime.now()
+  # upcoming show counts are read from the artist row, shows are not touched.
+  # matches on name, city or genre, most relevant first (see search.py)
+  # genre facet counts are taken from the matches themselves
   search = request.form.get('search_term', '')
-  artists = Artist.query.filter(Artist.name.ilike("%"+ search + "%")).all()
-  data = []
+  genres = request.form.getlist('genre')
+  artist_query = db.session.query(
+      Artist.id,
+      Artist.name,
+      Artist.genres,
+      Artist.upcoming_shows_count.label('num_upcoming_shows')
+    )
+  artists = artist_search.search(artist_facets.filter(artist_query, genres), search)
 
-  for artist in artists:
-    count = Shows.query.filter_by(artist_id = artist.id).filter(Shows.start_time > current_time).count()
-    data.append({
+  response = {
+    "count": len(artists),
+    "data": [{
       "id": artist.id,
       "name": artist.name,
-      "num_upcoming_shows": count
-    })
-    response = {
-      "count": len(artists),
-      "data": data
-    }
+      "num_upcoming_shows": artist.num_upcoming_shows
+    } for artist in artists],
+    "facets": artist_facets.count_rows(artists)
+  }
 
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''),
+                         genres=genres)
 
 @app.route('/artists/<int:artist_id>')
+@response_cache.cached('artist', 'artist_id')
 def show_artist(artist_id):
   # shows the venue page with the given venue_id DONE
   # TODO: replace with real venue data from the venues table, using venue_id
 
-  past_shows = db.session.query(Artist, Shows).join(Shows).join(Venue).\
-    filter(
-      Shows.artist_id == artist_id,
-      Shows.venue_id == Venue.id,
-      Shows.start_time < datetime.now()
+  # the artist, its shows and their venues come back in one outer joined query,
+  # then get split into past and upcoming against a single captured now
+  now = datetime.now()
+  rows = db.session.query(
+      Artist,
+      Shows.start_time,
+      Venue.id.label('venue_id'),
+      Venue.name.label('venue_name'),
+      Venue.image_link.label('venue_image_link')
     ).\
+    outerjoin(Shows, Shows.artist_id == Artist.id).\
+    outerjoin(Venue, Venue.id == Shows.venue_id).\
+    filter(Artist.id == artist_id).\
+    order_by(Shows.start_time).\
     all()
 
-  upcoming_shows = db.session.query(Artist, Shows).join(Shows).join(Venue).\
-    filter(
-      Shows.artist_id == artist_id,
-      Shows.venue_id == Venue.id,
-      Shows.start_time > datetime.now()
-    ).\
-    all()
-
-  artist = Artist.query.filter_by(id=artist_id).first_or_404()
+  if not rows:
+    abort(404)
+
+  artist = rows[0].Artist
+  past_shows = []
+  upcoming_shows = []
+  for row in rows:
+    if row.start_time is None:
+      continue
+    show_list = past_shows if row.start_time < now else upcoming_shows
+    show_list.append({
+      'venue_id': row.venue_id,
+      'venue_name': row.venue_name,
+      'venue_image_link': row.venue_image_link,
+      'start_time': row.start_time
+    })
 
   data = {
     'id': artist.id,
@@ -359,19 +560,8 @@ def show_artist(artist_id):
     "facebook_link": artist.facebook_link,
     "seeking_description": artist.seeking_description,
     
-    #add
-    'past_shows': [{
-      'venue_id': venue.id,
-      "venue_name": venue.name,
-      "venue_image_link": venue.image_link,
-      "start_time": show.start_time.strftime("%m/%d/%Y, %H:%M")
-    } for venue, show in past_shows],
-    'upcoming_shows': [{
-      'artist_id': artist.id,
-      'artist_name': artist.name,
-      'artist_image_link': artist.image_link,
-      'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-    } for artist, show in upcoming_shows],
+    'past_shows': past_shows,
+    'upcoming_shows': upcoming_shows,
     'past_shows_count': len(past_shows),
     'upcoming_shows_count': len(upcoming_shows)
   }
@@ -466,6 +656,7 @@ def create_artist_submission():
       )
       db.session.add(artist)
       db.session.commit()
+      response_cache.evict('artists')
       flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except():
       db.session.rollback()
@@ -492,29 +683,65 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@response_cache.cached('shows')
 def shows():
   # displays list of shows at /shows
   # TODO: replace with real venues data. DONE
   #       num_shows should be aggregated based on number of upcoming shows per venue.
-  
-  data = []
-
-  show_query = Shows.query.all()
-
-  for show in show_query:
-    artist_query = Artist.query.filter_by(id=show.artist_id).first()
-    venue_query = Venue.query.filter_by(id=show.venue_id).first()
-
-    data.append({
-        "venue_id": show.venue_id,
-        "venue_name": venue_query.name,
-        "artist_id": show.artist_id,
-        "artist_name": artist_query.name,
-        "artist_image_link": artist_query.image_link,
-        "start_time": show.start_time.strftime("%d/%m/%Y, %H:%M")
-      })
+  #
+  # shows, venue names and artist names/images come back from one joined query.
+  # pages are keyset paginated on (start_time, id) with ?after=<cursor>, so a late
+  # page costs the same as the first. ?stream=1 renders every show from the cursor
+  # on in chunks instead of building the whole page in memory.
+
+  after = request.args.get('after')
+  stream = request.args.get('stream', type=int)
+
+  show_query = db.session.query(
+      Shows.id,
+      Shows.start_time,
+      Shows.venue_id,
+      Venue.name.label('venue_name'),
+      Shows.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ).\
+    join(Venue, Venue.id == Shows.venue_id).\
+    join(Artist, Artist.id == Shows.artist_id).\
+    order_by(Shows.start_time, Shows.id)
 
-  return render_template('pages/shows.html', shows=data)
+  if after:
+    try:
+      start_time, show_id = after.rsplit('_', 1)
+      cursor = (datetime.fromisoformat(start_time), int(show_id))
+    except ValueError:
+      abort(400)
+    show_query = show_query.filter(tuple_(Shows.start_time, Shows.id) > cursor)
+
+  if stream:
+    data = (show_row(show) for show in show_query.yield_per(SHOWS_PER_PAGE))
+    return Response(stream_with_context(stream_template('pages/shows.html', shows=data)))
+
+  show_rows = show_query.limit(SHOWS_PER_PAGE + 1).all()
+  next_cursor = None
+  if len(show_rows) > SHOWS_PER_PAGE:
+    show_rows = show_rows[:SHOWS_PER_PAGE]
+    last = show_rows[-1]
+    next_cursor = last.start_time.isoformat() + '_' + str(last.id)
+
+  data = [show_row(show) for show in show_rows]
+
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
+
+def show_row(show):
+  return {
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_name,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_name,
+    "artist_image_link": show.artist_image_link,
+    "start_time": show.start_time
+  }
 
 @app.route('/shows/create')
 def create_shows():
@@ -528,16 +755,37 @@ def create_show_submission():
   # TODO: insert form data as a new Show record in the db, instead DONE
   form = ShowForm(request.form, meta={'csrf': False})
   if form.validate():
+    start_time = form.start_time.data
+    end_time = start_time + timedelta(minutes=form.duration_minutes.data)
+    double_booked = 'The venue already has a show between {:%Y-%m-%d %H:%M} and {:%Y-%m-%d %H:%M}. Show could not be listed.'.\
+      format(start_time, end_time)
+    if show_calendar.conflict(form.venue_id.data, start_time, end_time) is not None:
+      flash(double_booked)
+      return render_template('pages/home.html')
     try: 
       show = Shows(
         venue_id = form.venue_id.data,
         artist_id = form.artist_id.data,
-        start_time = form.start_time.data
+        start_time = start_time,
+        duration_minutes = form.duration_minutes.data
       )
+      # the venue and artist show counters are bumped in the same transaction
       db.session.add(show)
       db.session.commit()
+      response_cache.evict(
+        'shows',
+        'venues',
+        response_cache.key('venue', form.venue_id.data),
+        response_cache.key('artist', form.artist_id.data)
+      )
       flash('Show was successfully listed!')
 
+    except IntegrityError as e:
+      # on Postgres the shows_venue_no_overlap constraint catches a booking made since the check
+      db.session.rollback()
+      if 'shows_venue_no_overlap' not in str(e.orig):
+        raise
+      flash(double_booked)
     except():
       db.session.rollback()
       flash('An error occurred. Show could not be listed.')
@@ -556,6 +804,113 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
+#  ----------------------------------------------------------------
+#  Bulk import
+#  ----------------------------------------------------------------
+
+IMPORT_KINDS = {
+  'venues': (Venue, VenueForm),
+  'artists': (Artist, ArtistForm),
+  'shows': (Shows, ShowForm),
+}
+
+def show_import_check():
+  # the create page's double-booking check, also against the shows accepted earlier in the same import
+  book = show_calendar.new_bookings()
+  def check(values):
+    try:
+      venue_id = int(values['venue_id'])
+    except (TypeError, ValueError):
+      # left for the insert to refuse
+      return None
+    start_time = values['start_time']
+    end_time = start_time + timedelta(minutes=values['duration_minutes'])
+    if not book(venue_id, start_time, end_time):
+      return {'start_time': ['The venue already has a show between {:%Y-%m-%d %H:%M} and {:%Y-%m-%d %H:%M}.'.
+                             format(start_time, end_time)]}
+  return check
+
+def import_stream(kind, stream, format):
+  model, form_class = IMPORT_KINDS[kind]
+  check = show_import_check() if model is Shows else None
+  report = importer.import_rows(db.session, model, form_class, stream, format, check=check)
+  # rows went in through executemany, bypassing the mapper events and the create handlers
+  if report.inserted:
+    venue_search.reset()
+    artist_search.reset()
+    if model is Shows:
+      show_counters.rebuild()
+      show_calendar.reset()
+    elif model is Venue:
+      venue_facets.rebuild()
+    elif model is Artist:
+      artist_facets.rebuild()
+    response_cache.clear()
+  return report
+
+@app.route('/import/<kind>', methods=['POST'])
+def import_data(kind):
+  # takes a multipart 'file' upload or the raw request body as CSV, JSON or JSON lines.
+  # the format comes from ?format= or the uploaded file's extension
+  if kind not in IMPORT_KINDS:
+    abort(404)
+  upload = request.files.get('file')
+  format = request.args.get('format') or importer.guess_format(upload.filename if upload else None)
+  if format not in importer.FORMATS:
+    abort(400)
+  stream = io.TextIOWrapper(upload.stream if upload else request.stream, encoding='utf-8', newline='')
+  report = import_stream(kind, stream, format)
+  return jsonify(report.format())
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(importer.FORMATS), help='defaults to the file extension')
+def import_data_command(kind, path, format):
+  # flask import-data venues venues.csv
+  format = format or importer.guess_format(path)
+  if format is None:
+    raise click.UsageError('cannot tell the format of {}, pass --format'.format(path))
+  with open(path, encoding='utf-8', newline='') as stream:
+    report = import_stream(kind, stream, format)
+  for error in report.errors:
+    click.echo('line {}: {}'.format(error['line'], error['errors']), err=True)
+  click.echo('{} inserted, {} failed'.format(report.inserted, len(report.errors)))
+
+@app.cli.command('sweep-show-counts')
+@click.option('--rebuild', is_flag=True, help='recount every venue and artist')
+def sweep_show_counts_command(rebuild):
+  # run from cron, e.g. every minute: flask sweep-show-counts
+  if rebuild:
+    show_counters.rebuild()
+    changed = None
+  else:
+    changed = show_counters.sweep()
+  if changed is None:
+    response_cache.clear()
+    click.echo('rebuilt all show counts')
+    return
+  keys = [response_cache.key('venue', id) for id in changed['venue_id']]
+  keys += [response_cache.key('artist', id) for id in changed['artist_id']]
+  if keys:
+    response_cache.evict('venues', *keys)
+  click.echo('{} venues, {} artists updated'.format(len(changed['venue_id']), len(changed['artist_id'])))
+
+@app.route('/cache/stats')
+def cache_stats():
+  # hit/miss counts and hit rate per cached route
+  return jsonify(response_cache.stats())
+
+@app.route('/debug/sql', methods=['GET', 'DELETE'])
+def sql_stats():
+  # per-route query counts, DB time and the most repeated statements.
+  # DELETE starts the totals over
+  if not app.config['SQL_PROFILER_ENDPOINT']:
+    abort(404)
+  if request.method == 'DELETE':
+    sql_profiler.reset()
+  return jsonify(sql_profiler.stats())
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -565,13 +920,9 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    # records are written to LOG_FILE by a background thread, see logqueue.py
+    log_writer = init_logging(app)
+    atexit.register(log_writer.stop)
     app.logger.info('errors')
 
 #  ----------------------------------------------------------------
@@ -0,0 +1,329 @@
+#--------------------------------------------------------------
+# Venue availability and double-booking checks.
+#
+# A show occupies its venue for [start_time, start_time + duration).
+# On Postgres that period is fyyur_show_period(start_time,
+# duration_minutes) and migration a4d8e2f6b013 puts an exclusion
+# constraint on (venue_id, period). Its GiST index answers "is this venue
+# busy between a and b" without scanning the venue's shows, and the
+# constraint refuses overlapping bookings outright. Other databases
+# (SQLite, test databases) fall back to an in-process interval tree per
+# venue, built on first use and kept current as sessions commit.
+#--------------------------------------------------------------
+
+import random
+import threading
+from datetime import timedelta
+from itertools import groupby
+
+from sqlalchemy import DDL, and_, event, exists, func, select
+from sqlalchemy.orm import Session, object_session
+
+# rows per fetch while the fallback index is built
+LOAD_BATCH_SIZE = 1000
+
+# the same statements as the migration, for databases made with create_all
+PERIOD_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION fyyur_show_period(timestamp, integer) RETURNS tsrange "
+    "AS $$ SELECT tsrange($1, $1 + $2 * interval '1 minute') $$ LANGUAGE sql IMMUTABLE"
+)
+NO_OVERLAP = (
+    "ALTER TABLE shows ADD CONSTRAINT shows_venue_no_overlap EXCLUDE USING gist "
+    "(venue_id WITH =, fyyur_show_period(start_time, duration_minutes) WITH &&)"
+)
+
+
+class Node:
+    __slots__ = ('start', 'end', 'id', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, id):
+        self.start = start
+        self.end = end
+        self.id = id
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+    def key(self):
+        return (self.start, self.end, self.id)
+
+    def update(self):
+        self.max_end = self.end
+        for child in (self.left, self.right):
+            if child is not None and child.max_end > self.max_end:
+                self.max_end = child.max_end
+
+
+def rotate_right(node):
+    left = node.left
+    node.left, left.right = left.right, node
+    node.update()
+    left.update()
+    return left
+
+
+def rotate_left(node):
+    right = node.right
+    node.right, right.left = right.left, node
+    node.update()
+    right.update()
+    return right
+
+
+class IntervalTree:
+    '''
+    IntervalTree()
+        half-open [start, end) intervals in a treap ordered by start, every
+        node carrying the latest end below it, so a query skips any subtree
+        that ends before the window or starts after it
+    '''
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def from_sorted(cls, intervals):
+        '''
+        IntervalTree.from_sorted(intervals)
+            builds the treap from (start, end, id) tuples already in key
+            order in one pass, instead of one insert at a time
+        '''
+        tree = cls()
+        spine = []
+        for start, end, id in intervals:
+            node = Node(start, end, id)
+            popped = None
+            while spine and spine[-1].priority < node.priority:
+                popped = spine.pop()
+            node.left = popped
+            if spine:
+                spine[-1].right = node
+            spine.append(node)
+            tree.size += 1
+        tree.root = spine[0] if spine else None
+
+        # max_end from the leaves up
+        order = []
+        stack = [tree.root] if tree.root else []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+        for node in reversed(order):
+            node.update()
+        return tree
+
+    def add(self, start, end, id):
+        self.root = self.insert(self.root, Node(start, end, id))
+        self.size += 1
+
+    def insert(self, node, new):
+        if node is None:
+            return new
+        if new.key() < node.key():
+            node.left = self.insert(node.left, new)
+            if node.left.priority > node.priority:
+                node = rotate_right(node)
+        else:
+            node.right = self.insert(node.right, new)
+            if node.right.priority > node.priority:
+                node = rotate_left(node)
+        node.update()
+        return node
+
+    def remove(self, start, end, id):
+        size = self.size
+        self.root = self.delete(self.root, (start, end, id))
+        return self.size < size
+
+    def delete(self, node, key):
+        if node is None:
+            return None
+        if key < node.key():
+            node.left = self.delete(node.left, key)
+        elif key > node.key():
+            node.right = self.delete(node.right, key)
+        else:
+            if node.left is None or node.right is None:
+                self.size -= 1
+                return node.left or node.right
+            # rotate the higher priority child up and keep going down
+            if node.left.priority > node.right.priority:
+                node = rotate_right(node)
+                node.right = self.delete(node.right, key)
+            else:
+                node = rotate_left(node)
+                node.left = self.delete(node.left, key)
+        node.update()
+        return node
+
+    def overlapping(self, start, end, limit=None):
+        # ids of the intervals overlapping [start, end), ordered by start
+        found = []
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            # walk left while the subtree can still reach past start
+            while node is not None and node.max_end > start:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                break
+            node = stack.pop()
+            if node.start >= end:
+                break
+            if node.end > start and node.start < node.end:
+                found.append(node.id)
+                if limit and len(found) == limit:
+                    break
+            node = node.right
+        return found
+
+
+def period(start_time, duration_minutes):
+    return start_time, start_time + timedelta(minutes=duration_minutes)
+
+
+class ShowCalendar:
+    '''
+    ShowCalendar(db, shows, venue)
+        answers which venues are free in a window and whether a new show
+        would overlap one already booked at its venue
+    '''
+
+    def __init__(self, db, shows, venue):
+        self.db = db
+        self.shows = shows
+        self.venue = venue
+        self.index = None
+        self.lock = threading.Lock()
+        self.pending_key = 'show_calendar'
+        table = shows.__table__
+        for statement in ('CREATE EXTENSION IF NOT EXISTS btree_gist', PERIOD_FUNCTION):
+            event.listen(table, 'before_create', DDL(statement).execute_if(dialect='postgresql'))
+        event.listen(table, 'after_create', DDL(NO_OVERLAP).execute_if(dialect='postgresql'))
+        event.listen(shows, 'after_insert', self.on_insert)
+        event.listen(shows, 'after_update', self.on_update)
+        event.listen(shows, 'after_delete', self.on_delete)
+        event.listen(Session, 'after_commit', self.on_commit)
+        event.listen(Session, 'after_rollback', self.on_rollback)
+
+    def uses_database(self):
+        return self.db.engine.dialect.name == 'postgresql'
+
+    def booked(self, start, end):
+        shows = self.shows
+        return func.fyyur_show_period(shows.start_time, shows.duration_minutes).op('&&')(func.tsrange(start, end))
+
+    def queue(self, target, change):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(self.pending_key, []).append(change)
+
+    def change(self, action, target):
+        # venue_id may still be the form's string
+        return (action, int(target.venue_id), target.id) + period(target.start_time, target.duration_minutes)
+
+    def on_insert(self, mapper, connection, target):
+        self.queue(target, self.change('add', target))
+
+    def on_delete(self, mapper, connection, target):
+        self.queue(target, self.change('remove', target))
+
+    def on_update(self, mapper, connection, target):
+        # shows are not edited in place, start over rather than track the old period
+        self.queue(target, ('reset',))
+
+    def on_commit(self, session):
+        changes = session.info.pop(self.pending_key, None)
+        if not changes:
+            return
+        with self.lock:
+            if self.index is None:
+                return
+            for change in changes:
+                if change[0] == 'reset':
+                    self.index = None
+                    return
+                action, venue_id, id, start, end = change
+                tree = self.index.setdefault(venue_id, IntervalTree())
+                if action == 'add':
+                    tree.add(start, end, id)
+                else:
+                    tree.remove(start, end, id)
+
+    def on_rollback(self, session):
+        session.info.pop(self.pending_key, None)
+
+    def build_index(self):
+        with self.lock:
+            if self.index is None:
+                shows = self.shows
+                rows = self.db.session.query(shows.venue_id, shows.start_time, shows.duration_minutes, shows.id).\
+                    order_by(shows.venue_id, shows.start_time, shows.duration_minutes, shows.id).\
+                    yield_per(LOAD_BATCH_SIZE)
+                self.index = {
+                    venue_id: IntervalTree.from_sorted(
+                        period(row.start_time, row.duration_minutes) + (row.id,) for row in venue_rows
+                    )
+                    for venue_id, venue_rows in groupby(rows, key=lambda row: row.venue_id)
+                }
+        return self.index
+
+    def reset(self):
+        # drops the fallback index, e.g. after shows were bulk loaded
+        with self.lock:
+            self.index = None
+
+    def conflict(self, venue_id, start, end):
+        '''
+        conflict(venue_id, start, end)
+            id of a show at venue_id overlapping [start, end), or None
+        '''
+        if self.uses_database():
+            shows = self.shows
+            return self.db.session.execute(
+                select([shows.id]).where(and_(shows.venue_id == venue_id, self.booked(start, end))).limit(1)
+            ).scalar()
+        tree = self.build_index().get(int(venue_id))
+        found = tree.overlapping(start, end, limit=1) if tree is not None else []
+        return found[0] if found else None
+
+    def new_bookings(self):
+        '''
+        new_bookings()
+            returns book(venue_id, start, end) for checking a run of shows
+            that are not committed yet, e.g. an import. book() is False when
+            [start, end) overlaps a booked show or one it accepted before,
+            otherwise it remembers the period and returns True
+        '''
+        accepted = {}
+
+        def book(venue_id, start, end):
+            tree = accepted.setdefault(int(venue_id), IntervalTree())
+            if tree.overlapping(start, end, limit=1) or self.conflict(venue_id, start, end) is not None:
+                return False
+            tree.add(start, end, len(tree))
+            return True
+        return book
+
+    def available(self, query, start, end):
+        '''
+        available(query, start, end)
+            query selects from the venue model and includes its id column
+            returns the rows of query whose venue is free all of [start, end)
+        '''
+        venue = self.venue
+        if self.uses_database():
+            shows = self.shows
+            busy = exists().where(and_(shows.venue_id == venue.id, self.booked(start, end)))
+            return query.filter(~busy).all()
+
+        index = self.build_index()
+        return [row for row in query.all()
+                if row.id not in index or not index[row.id].overlapping(start, end, limit=1)]
@@ -0,0 +1,64 @@
+#--------------------------------------------------------------
+# Times /venues/available for one city against checking every
+# venue's shows one by one.
+#
+#   DATABASE_URL=postgresql://postgres@localhost:5432/fyyur_bench \
+#     python benchmarks/availability.py --seed
+#
+# --seed fills an empty database with 10k venues and 1M shows (see
+# seed.py) before timing. On Postgres the lookup goes through the
+# shows_venue_no_overlap GiST index, elsewhere through the in-process
+# interval trees.
+#--------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, show_calendar, Shows, Venue
+import seed
+
+
+def timed(f, repeat):
+    f()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def scan(start, end):
+    # the per-venue way: load each venue's shows and compare periods
+    free = []
+    for venue in Venue.query.filter_by(city='San Francisco'):
+        shows = db.session.query(Shows.start_time, Shows.duration_minutes).filter(Shows.venue_id == venue.id)
+        if not any(s < end and start < s + timedelta(minutes=d) for s, d in shows):
+            free.append(venue.id)
+    return free
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the venue availability lookup.')
+    parser.add_argument('--seed', action='store_true', help='seed 10k venues and 1M shows first')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if args.seed and not db.session.query(Venue.id).first():
+            seed.seed(venues=10000, artists=10000, shows=1000000)
+        client = app.test_client()
+        start = datetime.now().replace(second=0, microsecond=0) + timedelta(days=7)
+        end = start + timedelta(hours=3)
+        path = '/venues/available?city=San+Francisco&start={}&end={}'.format(start.isoformat(), end.isoformat())
+
+        started = time.perf_counter()
+        free = show_calendar.available(db.session.query(Venue.id).filter(Venue.city == 'San Francisco'), start, end)
+        print('{:<28} {:8.2f} ms'.format('first lookup', (time.perf_counter() - started) * 1000))
+        assert sorted(row.id for row in free) == sorted(scan(start, end))
+        print('{:<28} {:8.2f} ms  ({} free)'.format('GET /venues/available', timed(lambda: client.get(path), args.repeat), len(free)))
+        print('{:<28} {:8.2f} ms'.format('per-venue scan', timed(lambda: scan(start, end), max(args.repeat // 10, 1))))
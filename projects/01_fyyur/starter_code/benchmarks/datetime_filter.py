@@ -0,0 +1,72 @@
+#--------------------------------------------------------------
+# Renders a 5,000 show /shows page with the old string parsing
+# datetime filter and with the current one.
+#
+#   python benchmarks/datetime_filter.py
+#
+# No database is needed, the shows are built in memory.
+#--------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+
+from app import app, format_datetime
+
+
+def legacy_format_datetime(value, format='medium'):
+    # the filter as it was: every value is a string that gets parsed again
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def make_shows(count, as_string):
+    start = datetime(2030, 1, 1, 20, 0)
+    for n in range(count):
+        start_time = start + timedelta(hours=n)
+        yield {
+            'venue_id': 1,
+            'venue_name': 'The Musical Hop',
+            'artist_id': 1,
+            'artist_name': 'Guns N Petals',
+            'artist_image_link': '',
+            'start_time': start_time.strftime('%m/%d/%Y, %H:%M') if as_string else start_time
+        }
+
+
+def render(shows, datetime_filter, repeat):
+    app.jinja_env.filters['datetime'] = datetime_filter
+    template = app.jinja_env.get_template('pages/shows.html')
+    with app.test_request_context('/shows'):
+        context = {'shows': shows}
+        app.update_template_context(context)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            template.render(context)
+        return (time.perf_counter() - started) / repeat
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the datetime template filter.')
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    before = render(list(make_shows(args.shows, True)), legacy_format_datetime, args.repeat)
+    after = render(list(make_shows(args.shows, False)), format_datetime, args.repeat)
+    app.jinja_env.filters['datetime'] = format_datetime
+
+    print('before {:8.1f} ms'.format(before * 1000))
+    print('after  {:8.1f} ms'.format(after * 1000))
+    print('speedup {:7.1f}x'.format(before / after))
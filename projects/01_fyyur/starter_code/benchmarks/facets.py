@@ -0,0 +1,62 @@
+#--------------------------------------------------------------
+# Times a genre facet browse ("Jazz in San Francisco") and the facet
+# counts behind it, against the old way of counting genres by scanning.
+#
+#   DATABASE_URL=postgresql://postgres@localhost:5432/fyyur_bench \
+#     python benchmarks/facets.py --seed 1000000
+#
+# --seed fills an empty database with that many artists (see seed.py)
+# before timing.
+#--------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, artist_facets, Artist
+import seed
+
+BROWSE = '/artists?genre=Jazz&state=CA&city=San+Francisco'
+
+
+def timed(f, repeat):
+    f()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def scan_counts():
+    # what counting genres took before genre_counts: read every artist in the area
+    rows = db.session.query(Artist.genres).filter(Artist.state == 'CA', Artist.city == 'San Francisco')
+    return Counter(genre for genres, in rows for genre in genres or ())
+
+
+def table_counts():
+    artist_facets.reset()
+    return artist_facets.counts('CA', 'San Francisco')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the genre facet browse.')
+    parser.add_argument('--seed', type=int, default=0, help='seed this many artists first')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if args.seed and not db.session.query(Artist.id).first():
+            seed.seed(venues=0, artists=args.seed, shows=0)
+        client = app.test_client()
+
+        print('{:<44} {:8.2f} ms'.format('counts by scanning the area', timed(scan_counts, args.repeat)))
+        print('{:<44} {:8.2f} ms'.format('counts from genre_counts', timed(table_counts, args.repeat)))
+        print('{:<44} {:8.2f} ms'.format('counts from the process cache',
+                                         timed(lambda: artist_facets.counts('CA', 'San Francisco'), args.repeat)))
+        print('{:<44} {:8.2f} ms'.format('GET ' + BROWSE.split('?')[1],
+                                         timed(lambda: client.get(BROWSE), args.repeat)))
@@ -0,0 +1,127 @@
+#--------------------------------------------------------------
+# Request latency of a log-heavy route with the old synchronous
+# FileHandler and with the queue + background writer from logqueue.py.
+#
+#   python benchmarks/request_logging.py --lines 50 --write-latency 0.5
+#
+# Every write to the log file is delayed by --write-latency ms to stand in
+# for a slow or busy disk. The FileHandler pays that once per record on
+# the request thread, the writer once per batch on its own thread.
+# No database is needed.
+#--------------------------------------------------------------
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.logging import default_handler
+
+from logqueue import TEXT_FORMAT, JSONFormatter, LogWriter, QueueHandler, RequestFilter
+
+
+class SlowStream:
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, data):
+        time.sleep(self.latency)
+        return self.stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def make_app(lines):
+    app = Flask('request_logging')
+    app.logger.removeHandler(default_handler)
+
+    @app.route('/log-heavy')
+    def log_heavy():
+        for n in range(lines):
+            app.logger.info('working on item %d of %d', n, lines)
+        return 'ok'
+
+    return app
+
+
+def run(app, clients, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        test_client = app.test_client()
+        mine = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            test_client.get('/log-heavy')
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'rps': len(latencies) / elapsed,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark log-heavy requests.')
+    parser.add_argument('--lines', type=int, default=50, help='log records per request')
+    parser.add_argument('--write-latency', type=float, default=0.5, help='ms added to every file write')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='per client')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+    latency = args.write_latency / 1000
+    formatter = JSONFormatter() if args.json else logging.Formatter(TEXT_FORMAT)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(args.lines)
+        handler = logging.StreamHandler(SlowStream(open(os.path.join(directory, 'sync.log'), 'a'), latency))
+        handler.setFormatter(formatter)
+        app.logger.addHandler(handler)
+        app.logger.setLevel(logging.INFO)
+        synchronous = run(app, args.clients, args.requests)
+        # both apps share the 'request_logging' logger
+        app.logger.removeHandler(handler)
+        handler.stream.close()
+
+        app = make_app(args.lines)
+        path = os.path.join(directory, 'queued.log')
+        writer = LogWriter(path, formatter, queue_size=100000)
+        writer.stream = SlowStream(open(path, 'ab'), latency)
+        handler = QueueHandler(writer.records)
+        handler.addFilter(RequestFilter())
+        app.logger.addHandler(handler)
+        app.logger.setLevel(logging.INFO)
+        writer.start()
+        queued = run(app, args.clients, args.requests)
+        started = time.perf_counter()
+        writer.stop(timeout=None)
+        drain = time.perf_counter() - started
+
+    print('{} records per request, {} ms per file write, {} clients'.format(
+        args.lines, args.write_latency, args.clients))
+    print('{:12} {:>10} {:>10} {:>10}'.format('', 'p50 ms', 'p99 ms', 'req/s'))
+    for name, result in (('FileHandler', synchronous), ('queue', queued)):
+        print('{:12} {:10.2f} {:10.2f} {:10.0f}'.format(name, result['p50'], result['p99'], result['rps']))
+    print('queue drained {:.2f} s after the last request, {} records dropped'.format(drain, handler.dropped))
@@ -0,0 +1,56 @@
+#--------------------------------------------------------------
+# Times the documented venue and artist searches.
+#
+#   DATABASE_URL=postgresql://postgres@localhost:5432/fyyur_bench \
+#     python benchmarks/search.py --seed
+#
+# --seed fills an empty database with 100k venues and 100k artists
+# (see seed.py) before timing.
+#--------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import app, db, Venue
+import seed
+
+SEARCHES = [
+    ('/venues/search', 'Hop'),
+    ('/venues/search', 'Music'),
+    ('/artists/search', 'A'),
+]
+
+
+def run(repeat):
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    client = app.test_client()
+
+    for path, term in SEARCHES:
+        client.post(path, data={'search_term': term})
+        del statements[:]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            client.post(path, data={'search_term': term})
+        elapsed = (time.perf_counter() - started) / repeat
+        print('{:<16} {:<6} {:8.2f} ms {:6d} queries'.format(
+            path, repr(term), elapsed * 1000, len(statements) // repeat))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Fyyur search endpoints.')
+    parser.add_argument('--seed', action='store_true', help='seed 100k venues and artists first')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.seed and not db.session.query(Venue.id).first():
+            db.create_all()
+            seed.seed(venues=100000, artists=100000, shows=200000)
+        run(args.repeat)
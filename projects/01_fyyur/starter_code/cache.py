@@ -0,0 +1,259 @@
+#--------------------------------------------------------------
+# Rendered page cache for the read-only Fyyur routes.
+#
+# Pages are stored under '<route>' or '<route>:<id>' keys in a pluggable
+# backend: an in-process LRU with TTL, or any server that speaks the
+# memcached text protocol. The create handlers evict the keys they
+# affect after a successful commit.
+#--------------------------------------------------------------
+
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    '''
+    LRUCache(size)
+        in-process cache holding at most size entries, least recently
+        used entries are dropped first and expired ones on read
+    '''
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires and expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl if ttl else 0)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class MemcachedCache:
+    '''
+    MemcachedCache(host, port)
+        talks the memcached text protocol over one socket per thread.
+        a failing server is logged and treated as a miss, never as an error.
+        keys are '<prefix><generation>:<key>'. clear() bumps the generation
+        kept on the server instead of flushing it, so other users of the
+        server keep their keys. each process rereads the generation at most
+        every generation_ttl seconds
+    '''
+
+    def __init__(self, host='127.0.0.1', port=11211, prefix='fyyur:', timeout=0.5, generation_ttl=1.0):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.timeout = timeout
+        self.generation_ttl = generation_ttl
+        self.generation = None
+        self.generation_read = 0
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection(self.address, self.timeout)
+            conn = self.local.conn = (sock, sock.makefile('rb'))
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        self.local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def command(self, line, data=None):
+        try:
+            sock, reader = self.connection()
+            payload = line.encode() + b'\r\n'
+            if data is not None:
+                payload += data + b'\r\n'
+            sock.sendall(payload)
+            return reader
+        except OSError as e:
+            logger.warning('memcached %s: %s', self.address, e)
+            self.close()
+            return None
+
+    def key(self, key):
+        now = time.monotonic()
+        if self.generation is None or now - self.generation_read > self.generation_ttl:
+            self.generation = self.fetch(self.prefix + 'generation') or '0'
+            self.generation_read = now
+        return '{}{}:{}'.format(self.prefix, self.generation, key)
+
+    def get(self, key):
+        return self.fetch(self.key(key))
+
+    def fetch(self, key):
+        reader = self.command('get ' + key)
+        if reader is None:
+            return None
+        try:
+            header = reader.readline().split()
+            if not header or header[0] != b'VALUE':
+                return None
+            data = reader.read(int(header[3]) + 2)[:-2]
+            reader.readline()  # END
+            return data.decode()
+        except (OSError, IndexError, ValueError) as e:
+            logger.warning('memcached %s: %s', self.address, e)
+            self.close()
+            return None
+
+    def set(self, key, value, ttl):
+        data = value.encode()
+        reader = self.command('set {} 0 {} {}'.format(self.key(key), int(ttl), len(data)), data)
+        if reader is not None:
+            self.read_status(reader)
+
+    def delete(self, key):
+        reader = self.command('delete ' + self.key(key))
+        if reader is not None:
+            self.read_status(reader)
+
+    def clear(self):
+        # keys of older generations are never read again and age out
+        reader = self.command('incr {}generation 1'.format(self.prefix))
+        if reader is not None and self.read_status(reader) == b'NOT_FOUND':
+            reader = self.command('add {}generation 0 0 1'.format(self.prefix), b'1')
+            if reader is not None:
+                self.read_status(reader)
+        self.generation = None
+
+    def read_status(self, reader):
+        try:
+            return reader.readline().strip()
+        except OSError as e:
+            logger.warning('memcached %s: %s', self.address, e)
+            self.close()
+
+
+def make_backend(url, size):
+    '''
+    make_backend(url, size)
+        '' disables caching, 'memory' is the in-process LRU and
+        'memcached://host:port' a memcached server
+    '''
+    if not url:
+        return None
+    if url == 'memory':
+        return LRUCache(size)
+    if url.startswith('memcached://'):
+        host, _, port = url[len('memcached://'):].partition(':')
+        return MemcachedCache(host or '127.0.0.1', int(port or 11211))
+    raise ValueError('unknown cache backend ' + url)
+
+
+class ResponseCache:
+    '''
+    ResponseCache(backend, ttl)
+        caches the html of GET views wrapped with cached() and keeps
+        hit/miss counts per route. clear() drops the pages but keeps the
+        counts, reset_stats() starts those over
+    '''
+
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def key(self, route, id=None):
+        return route if id is None else '{}:{}'.format(route, id)
+
+    def count(self, route, outcome):
+        with self.lock:
+            counts = self.counts.setdefault(route, {'hits': 0, 'misses': 0, 'evictions': 0})
+            counts[outcome] += 1
+
+    def cached(self, route, id_arg=None):
+        '''
+        @cached(route, id_arg)
+            id_arg names the view argument that completes the key.
+            requests with query arguments or pending flash messages are
+            rendered fresh and never stored
+        '''
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if self.backend is None or request.args or '_flashes' in session:
+                    return f(*args, **kwargs)
+
+                key = self.key(route, kwargs.get(id_arg) if id_arg else None)
+                body = self.backend.get(key)
+                if body is not None:
+                    self.count(route, 'hits')
+                    return Response(body, headers={'X-Cache': 'HIT'})
+
+                self.count(route, 'misses')
+                rv = f(*args, **kwargs)
+                if isinstance(rv, str) and '_flashes' not in session:
+                    self.backend.set(key, rv, self.ttl)
+                response = make_response(rv)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def evict(self, *keys):
+        if self.backend is None:
+            return
+        for key in keys:
+            self.backend.delete(key)
+            self.count(key.partition(':')[0], 'evictions')
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts = {}
+
+    def stats(self):
+        with self.lock:
+            routes = {route: dict(counts) for route, counts in self.counts.items()}
+        hits = sum(counts['hits'] for counts in routes.values())
+        misses = sum(counts['misses'] for counts in routes.values())
+        for counts in routes.values():
+            lookups = counts['hits'] + counts['misses']
+            counts['hit_rate'] = counts['hits'] / lookups if lookups else 0.0
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'routes': routes
+        }
@@ -9,7 +9,38 @@ DEBUG = True
 # Connect to the database
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur')
 
 
 WTF_CSRF_ENABLED = False
+
+# Rendered page cache: 'memory' for the in-process LRU, 'memcached://host:port'
+# for a memcached server, or '' to turn it off.
+RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'memory')
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_SIZE = 1024
+
+# Seconds each process keeps the per-genre venue and artist counts it read
+# before reading them again. Its own changes are applied to them meanwhile.
+GENRE_FACET_TTL = 60
+
+# SQL profiler, off unless asked for: query count and DB time per request
+# in X-SQL-* headers and a warning when one request repeats a statement
+# more than the threshold. SQL_PROFILER_ENDPOINT=1 also serves the
+# per-route totals at /debug/sql.
+SQL_PROFILER = os.environ.get('SQL_PROFILER', '0') == '1'
+SQL_PROFILER_REPEAT_THRESHOLD = int(os.environ.get('SQL_PROFILER_REPEAT_THRESHOLD', 10))
+SQL_PROFILER_ENDPOINT = os.environ.get('SQL_PROFILER_ENDPOINT', '0') == '1'
+
+# Logging when DEBUG is off: records go through a queue to a background
+# writer that appends them to LOG_FILE in batches and rotates it at
+# LOG_MAX_BYTES. LOG_JSON writes one JSON object per line with the
+# request id and latency, LOG_REQUESTS adds an access line per request.
+LOG_FILE = os.environ.get('LOG_FILE', os.path.join(basedir, 'error.log'))
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = 5
+LOG_BATCH_SIZE = 100
+LOG_FLUSH_INTERVAL = 0.5
+LOG_QUEUE_SIZE = 10000
+LOG_JSON = os.environ.get('LOG_JSON', '0') == '1'
+LOG_REQUESTS = os.environ.get('LOG_REQUESTS', '1') != '0'
@@ -0,0 +1,185 @@
+#--------------------------------------------------------------
+# Genre facets for the venue and artist list and search pages.
+#
+# Filtering on genres uses the GIN indexes added by migration
+# 7f3b2a6c1e05 on Postgres (genres @> ARRAY[...]) and json_each
+# elsewhere. Per-genre counts live in the genre_counts table, one row per
+# kind, state, city and genre, moved by mapper events in the same
+# transaction as the row that changed. Reading them is a short indexed
+# scan, and each process keeps what it read for ttl seconds, applying
+# its own committed changes to the cached counts as it goes.
+#--------------------------------------------------------------
+
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import and_, event, func, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.orm import Session, object_session
+
+
+def area(row):
+    return (row.state or '', row.city or '')
+
+
+class GenreFacets:
+    '''
+    GenreFacets(db, model, counts, ttl)
+        filters model queries by genre and counts model rows per genre,
+        counts is the genre_counts model
+    '''
+
+    def __init__(self, db, model, counts, ttl=60):
+        self.db = db
+        self.model = model
+        self.counts_table = counts.__table__
+        self.kind = model.__tablename__.lower()
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # (state, city) -> (expires, {genre: count}), None matches any
+        self.cache = {}
+        self.pending_key = 'genre_facets_' + self.kind
+        event.listen(model, 'after_insert', self.on_insert)
+        event.listen(model, 'after_update', self.on_update)
+        event.listen(model, 'after_delete', self.on_delete)
+        event.listen(Session, 'after_commit', self.on_commit)
+        event.listen(Session, 'after_rollback', self.on_rollback)
+
+    def uses_database(self):
+        return self.db.engine.dialect.name == 'postgresql'
+
+    def filter(self, query, genres):
+        '''
+        filter(query, genres)
+            keeps the rows of query that have every one of genres
+        '''
+        if not genres:
+            return query
+        if self.uses_database():
+            return query.filter(self.model.genres.contains(list(genres)))
+        table = self.model.__table__.name
+        for n, genre in enumerate(genres):
+            name = 'genre_{}'.format(n)
+            query = query.filter(text(
+                'EXISTS (SELECT 1 FROM json_each("{}".genres) WHERE value = :{})'.format(table, name)
+            ).bindparams(**{name: genre}))
+        return query
+
+    def counts(self, state=None, city=None):
+        '''
+        counts(state, city)
+            [(genre, count)] of the rows in state and city (either may be
+            None for all), most common first
+        '''
+        key = (state, city)
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return self.ordered(entry[1])
+
+        table = self.counts_table
+        query = select([table.c.genre, func.sum(table.c.count)]).\
+            where(table.c.kind == self.kind).\
+            group_by(table.c.genre)
+        if state is not None:
+            query = query.where(table.c.state == state)
+        if city is not None:
+            query = query.where(table.c.city == city)
+        counts = {genre: int(count) for genre, count in self.db.session.execute(query)}
+
+        with self.lock:
+            self.cache[key] = (time.monotonic() + self.ttl, counts)
+        return self.ordered(counts)
+
+    def ordered(self, counts):
+        return sorted(((genre, count) for genre, count in counts.items() if count > 0),
+                      key=lambda item: (-item[1], item[0]))
+
+    def count_rows(self, rows):
+        # facet counts over rows already in hand, e.g. search results
+        counts = Counter(genre for row in rows for genre in row.genres or ())
+        return self.ordered(counts)
+
+    def changes(self, target, old=None):
+        # [((state, city), genre, step)]
+        deltas = []
+        if old is not None:
+            deltas += [(old[0], genre, -1) for genre in set(old[1] or ())]
+        if target is not None:
+            deltas += [(area(target), genre, 1) for genre in set(target.genres or ())]
+        return deltas
+
+    def apply(self, connection, target, deltas):
+        if not deltas:
+            return
+        table = self.counts_table
+        for (state, city), genre, step in deltas:
+            row = {'kind': self.kind, 'state': state, 'city': city, 'genre': genre}
+            if connection.dialect.name == 'postgresql':
+                connection.execute(
+                    postgresql_insert(table).
+                    values(count=step, **row).
+                    on_conflict_do_update(index_elements=list(row), set_={'count': table.c.count + step})
+                )
+                continue
+            match = and_(*[table.c[name] == value for name, value in row.items()])
+            if connection.execute(table.update().where(match).values(count=table.c.count + step)).rowcount == 0:
+                connection.execute(table.insert().values(count=step, **row))
+
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(self.pending_key, []).extend(deltas)
+
+    def on_insert(self, mapper, connection, target):
+        self.apply(connection, target, self.changes(target))
+
+    def on_update(self, mapper, connection, target):
+        state = inspect(target)
+        history = {name: state.attrs[name].history for name in ('genres', 'state', 'city')}
+        if not any(changes.has_changes() for changes in history.values()):
+            return
+
+        def before(name):
+            changes = history[name]
+            if changes.deleted:
+                return changes.deleted[0]
+            return None if changes.added else getattr(target, name)
+        old = ((before('state') or '', before('city') or ''), before('genres'))
+        self.apply(connection, target, self.changes(target, old))
+
+    def on_delete(self, mapper, connection, target):
+        self.apply(connection, target, self.changes(None, (area(target), target.genres)))
+
+    def on_commit(self, session):
+        deltas = session.info.pop(self.pending_key, None)
+        if not deltas:
+            return
+        with self.lock:
+            for (state, city), genre, step in deltas:
+                for (cached_state, cached_city), (_, counts) in self.cache.items():
+                    if cached_state in (None, state) and cached_city in (None, city):
+                        counts[genre] = counts.get(genre, 0) + step
+
+    def on_rollback(self, session):
+        session.info.pop(self.pending_key, None)
+
+    def reset(self):
+        with self.lock:
+            self.cache = {}
+
+    def rebuild(self):
+        # recounts from the model table, e.g. after rows were bulk inserted
+        if self.uses_database():
+            genres, genre = 'CROSS JOIN LATERAL unnest(t.genres) AS g(genre)', 'g.genre'
+        else:
+            genres, genre = ', json_each(t.genres) AS g', 'g.value'
+        with self.db.engine.begin() as connection:
+            connection.execute(self.counts_table.delete().where(self.counts_table.c.kind == self.kind))
+            connection.execute(text(
+                'INSERT INTO genre_counts (kind, state, city, genre, count) '
+                'SELECT :kind, coalesce(t.state, \'\'), coalesce(t.city, \'\'), {genre}, count(*) '
+                'FROM "{table}" t {genres} GROUP BY 2, 3, 4'.format(
+                    table=self.model.__table__.name, genres=genres, genre=genre)
+            ), kind=self.kind)
+        self.reset()
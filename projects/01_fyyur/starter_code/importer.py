@@ -0,0 +1,236 @@
+#--------------------------------------------------------------
+# Bulk import of venues, artists and shows from CSV, JSON or JSON lines.
+#
+# Rows are read one at a time from the stream, validated with the same
+# forms the create pages use and inserted with executemany in batches.
+# A row that fails validation or the insert is reported with its line
+# number and the import carries on with the next one. A caller can add
+# its own per-row check, e.g. for double-booked shows.
+#--------------------------------------------------------------
+
+import csv
+import json
+
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from wtforms import BooleanField, SelectMultipleField
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+# longest JSON array element buffered while looking for its end
+MAX_ROW_SIZE = 1024 * 1024
+FORMATS = ('csv', 'json', 'jsonl')
+
+# a boolean field is off when its value is missing or one of these
+FALSE_VALUES = ('', '0', 'false', 'f', 'n', 'no', 'off')
+
+
+class ImportReport:
+    '''
+    ImportReport
+        counts inserted rows and collects the errors of rejected ones.
+        line is the CSV or JSON lines line number, or the position of
+        the object in a JSON array
+    '''
+
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []
+
+    def error(self, line, errors):
+        self.errors.append({'line': line, 'errors': errors})
+
+    def format(self):
+        return {
+            'inserted': self.inserted,
+            'failed': len(self.errors),
+            'errors': self.errors
+        }
+
+
+def guess_format(filename):
+    extension = (filename or '').rpartition('.')[2].lower()
+    if extension == 'ndjson':
+        return 'jsonl'
+    return extension if extension in FORMATS else None
+
+
+def iter_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_jsonl(stream):
+    for line, text in enumerate(stream, 1):
+        if text.strip():
+            try:
+                yield line, json.loads(text)
+            except ValueError as e:
+                yield line, e
+
+
+def read_more(stream, buffer, position):
+    chunk = stream.read(CHUNK_SIZE)
+    return buffer[position:] + chunk, 0, not chunk
+
+
+def object_end(buffer, start):
+    # index just past the brace closing the object at start, None if the
+    # buffer does not reach it yet
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(buffer)):
+        char = buffer[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
+
+
+def iter_json(stream):
+    # walks a top level array of objects without reading the whole file
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    started = False
+    line = 0
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ValueError('unexpected end of JSON array')
+            buffer, position, eof = read_more(stream, buffer, position)
+            continue
+
+        char = buffer[position]
+        if not started:
+            if char != '[':
+                raise ValueError('expected a JSON array of objects')
+            started = True
+            position += 1
+            continue
+        if char == ']':
+            return
+        if char != '{':
+            raise ValueError('expected a JSON object at row {}'.format(line + 1))
+
+        try:
+            row, end = decoder.raw_decode(buffer, position)
+        except ValueError as e:
+            end = object_end(buffer, position)
+            if end is None:
+                # not all read yet, or never closed
+                if eof:
+                    raise ValueError('unexpected end of JSON array')
+                if len(buffer) - position > MAX_ROW_SIZE:
+                    raise ValueError('row {} is not closed within {} characters'.format(line + 1, MAX_ROW_SIZE))
+                buffer, position, eof = read_more(stream, buffer, position)
+                continue
+            # the whole object is there and still does not parse, skip it
+            row = ValueError('invalid JSON object: {}'.format(getattr(e, 'msg', e)))
+
+        line += 1
+        position = end
+        yield line, row
+
+
+READERS = {'csv': iter_csv, 'json': iter_json, 'jsonl': iter_jsonl}
+
+
+def form_data(row, fields):
+    # turns a parsed row into the MultiDict a form would get from a POST
+    data = MultiDict()
+    for name, field in fields.items():
+        value = row.get(name)
+        if value is None:
+            continue
+        if isinstance(field, BooleanField):
+            if str(value).strip().lower() not in FALSE_VALUES:
+                data.add(name, 'y')
+        elif isinstance(field, SelectMultipleField):
+            values = value if isinstance(value, list) else str(value).split(',')
+            for item in values:
+                if str(item).strip():
+                    data.add(name, str(item).strip())
+        else:
+            data.add(name, str(value))
+    return data
+
+
+def insert_batch(session, table, batch, report):
+    try:
+        session.execute(table.insert(), [values for _, values in batch])
+        session.commit()
+        report.inserted += len(batch)
+        return
+    except SQLAlchemyError:
+        session.rollback()
+
+    # something in the batch was refused, find out which rows
+    for line, values in batch:
+        try:
+            session.execute(table.insert(), values)
+            session.commit()
+            report.inserted += 1
+        except SQLAlchemyError as e:
+            session.rollback()
+            report.error(line, {'database': [str(getattr(e, 'orig', e))]})
+
+
+def import_rows(session, model, form_class, stream, format, batch_size=BATCH_SIZE, check=None):
+    '''
+    import_rows(session, model, form_class, stream, format, check)
+        stream is a text stream in one of FORMATS. every row is checked with
+        form_class, then with check(values) if given, which returns form
+        style errors or None. the valid ones are inserted into model's table
+        batch_size rows at a time. returns an ImportReport
+    '''
+    table = model.__table__
+    fields = dict(form_class(formdata=None, meta={'csrf': False})._fields)
+    report = ImportReport()
+    batch = []
+
+    try:
+        for line, row in READERS[format](stream):
+            if not isinstance(row, dict):
+                report.error(line, {'row': [str(row) if isinstance(row, Exception) else 'expected an object']})
+                continue
+
+            form = form_class(formdata=form_data(row, fields), meta={'csrf': False})
+            if not form.validate():
+                report.error(line, form.errors)
+                continue
+
+            values = {name: value for name, value in form.data.items() if name in table.c}
+            errors = check(values) if check is not None else None
+            if errors:
+                report.error(line, errors)
+                continue
+
+            batch.append((line, values))
+            if len(batch) == batch_size:
+                insert_batch(session, table, batch, report)
+                batch = []
+    except (ValueError, csv.Error) as e:
+        report.error(None, {'file': [str(e)]})
+
+    if batch:
+        insert_batch(session, table, batch, report)
+    return report
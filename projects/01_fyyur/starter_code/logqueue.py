@@ -0,0 +1,199 @@
+#--------------------------------------------------------------
+# Non-blocking application logging.
+#
+# Log calls on the request thread only put the record on a bounded queue.
+# A background thread takes records off in batches, formats them (plain
+# text or JSON lines) and writes each batch with a single write, rotating
+# the file when it grows past max_bytes. When the queue is full records
+# are dropped and counted rather than making the request wait.
+#--------------------------------------------------------------
+
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+
+
+class QueueHandler(logging.Handler):
+    '''
+    QueueHandler(records)
+        puts records on the queue without waiting. the message is merged
+        with its arguments here, on the calling thread, so the writer
+        never touches objects that may change after the call
+    '''
+
+    def __init__(self, records, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = records
+        self.dropped = 0
+
+    def emit(self, record):
+        try:
+            message = record.getMessage()
+            exc_text = record.exc_text
+            if record.exc_info and not exc_text:
+                exc_text = logging.Formatter().formatException(record.exc_info)
+            # other handlers still see the original record
+            record = copy.copy(record)
+            record.msg, record.args, record.exc_info, record.exc_text = message, None, None, exc_text
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class RequestFilter(logging.Filter):
+    # runs on the request thread, where the request context is available
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+            started = g.get('request_started')
+            if started is not None and not hasattr(record, 'latency_ms'):
+                record.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    FIELDS = ('request_id', 'method', 'path', 'status', 'latency_ms')
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data)
+
+
+class LogWriter(threading.Thread):
+    '''
+    LogWriter(path, formatter, max_bytes, backup_count, batch_size, flush_interval)
+        drains the queue into path. a batch is written when batch_size
+        records are waiting or flush_interval seconds have passed
+    '''
+
+    def __init__(self, path, formatter, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 batch_size=100, flush_interval=0.5, queue_size=10000):
+        super().__init__(name='log-writer', daemon=True)
+        self.path = path
+        self.formatter = formatter
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records = queue.Queue(queue_size)
+        self.stopping = threading.Event()
+        self.stream = None
+
+    def run(self):
+        while not (self.stopping.is_set() and self.records.empty()):
+            batch = self.next_batch()
+            if batch:
+                self.write(batch)
+        if self.stream is not None:
+            self.stream.close()
+
+    def next_batch(self):
+        try:
+            batch = [self.records.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.records.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record) + '\n')
+            except Exception:
+                lines.append('unformattable log record: {!r}\n'.format(record.msg))
+        data = ''.join(lines).encode('utf-8')
+
+        if self.stream is None:
+            self.stream = open(self.path, 'ab')
+        if self.max_bytes and self.stream.tell() and self.stream.tell() + len(data) > self.max_bytes:
+            self.rotate()
+        self.stream.write(data)
+        self.stream.flush()
+
+    def rotate(self):
+        # error.log -> error.log.1 -> ... -> error.log.<backup_count>
+        self.stream.close()
+        for n in range(self.backup_count - 1, 0, -1):
+            source = '{}.{}'.format(self.path, n)
+            if os.path.exists(source):
+                os.replace(source, '{}.{}'.format(self.path, n + 1))
+        if self.backup_count:
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self.stream = open(self.path, 'ab')
+
+    def stop(self, timeout=5):
+        # writes whatever is still queued
+        self.stopping.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+def init_logging(app):
+    '''
+    init_logging(app)
+        sends app.logger through a LogWriter configured by the LOG_* settings,
+        tags requests with an id (X-Request-ID) and optionally logs one
+        access line per request with its status and latency
+    '''
+    config = app.config
+    formatter = JSONFormatter() if config['LOG_JSON'] else logging.Formatter(TEXT_FORMAT)
+    writer = LogWriter(config['LOG_FILE'], formatter,
+                       max_bytes=config['LOG_MAX_BYTES'],
+                       backup_count=config['LOG_BACKUP_COUNT'],
+                       batch_size=config['LOG_BATCH_SIZE'],
+                       flush_interval=config['LOG_FLUSH_INTERVAL'],
+                       queue_size=config['LOG_QUEUE_SIZE'])
+    handler = QueueHandler(writer.records, logging.INFO)
+    handler.addFilter(RequestFilter())
+    app.logger.setLevel(logging.INFO)
+    app.logger.addHandler(handler)
+    writer.start()
+
+    @app.before_request
+    def start_request():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_request(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        if config['LOG_REQUESTS'] and g.get('request_started') is not None:
+            latency = round((time.perf_counter() - g.request_started) * 1000, 2)
+            app.logger.info('%s %s %s', request.method, request.full_path.rstrip('?'), response.status_code,
+                            extra={'status': response.status_code, 'latency_ms': latency})
+        return response
+
+    return writer
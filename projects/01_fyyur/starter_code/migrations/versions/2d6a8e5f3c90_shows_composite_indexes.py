@@ -0,0 +1,26 @@
+"""Composite indexes on shows.
+
+Revision ID: 2d6a8e5f3c90
+Revises: 9b1f0c2d7e41
+Create Date: 2026-10-18 11:04:52.203117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d6a8e5f3c90'
+down_revision = '9b1f0c2d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'])
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'])
+
+
+def downgrade():
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,49 @@
+"""Stored upcoming/past show counts.
+
+Revision ID: 5e1a7c9d2b48
+Revises: 2d6a8e5f3c90
+Create Date: 2026-10-18 14:21:07.640391
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1a7c9d2b48'
+down_revision = '2d6a8e5f3c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'))
+    op.create_table('show_count_sweep',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('swept_until', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_shows_start_time', 'shows', ['start_time'])
+
+    # count the existing shows as of now and start the sweeps from there
+    now = datetime.now()
+    for table, column in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.get_bind().execute(sa.text(
+            'UPDATE "{0}" SET '
+            'upcoming_shows_count = (SELECT count(*) FROM shows WHERE shows.{1} = "{0}".id AND start_time > :now), '
+            'past_shows_count = (SELECT count(*) FROM shows WHERE shows.{1} = "{0}".id AND start_time <= :now)'
+            .format(table, column)
+        ), now=now)
+    op.get_bind().execute(sa.text('INSERT INTO show_count_sweep (id, swept_until) VALUES (1, :now)'), now=now)
+
+
+def downgrade():
+    op.drop_index('ix_shows_start_time', table_name='shows')
+    op.drop_table('show_count_sweep')
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,48 @@
+"""Genre facet indexes and counts.
+
+Revision ID: 7f3b2a6c1e05
+Revises: 5e1a7c9d2b48
+Create Date: 2026-10-18 16:02:44.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f3b2a6c1e05'
+down_revision = '5e1a7c9d2b48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # genres @> ARRAY['Jazz'] is answered from these, array_ops is the default opclass
+    op.create_index('ix_venue_genres', 'Venue', ['genres'], postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'Artist', ['genres'], postgresql_using='gin')
+    op.create_index('ix_venue_state_city', 'Venue', ['state', 'city'])
+    op.create_index('ix_artist_state_city_id', 'Artist', ['state', 'city', 'id'])
+
+    op.create_table('genre_counts',
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('genre', sa.String(length=120), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'state', 'city', 'genre')
+    )
+    for table in ('Venue', 'Artist'):
+        op.execute(
+            "INSERT INTO genre_counts (kind, state, city, genre, count) "
+            "SELECT '{0}', coalesce(t.state, ''), coalesce(t.city, ''), g.genre, count(*) "
+            "FROM \"{1}\" t CROSS JOIN LATERAL unnest(t.genres) AS g(genre) "
+            "GROUP BY 2, 3, 4".format(table.lower(), table)
+        )
+
+
+def downgrade():
+    op.drop_table('genre_counts')
+    op.drop_index('ix_artist_state_city_id', table_name='Artist')
+    op.drop_index('ix_venue_state_city', table_name='Venue')
+    op.drop_index('ix_artist_genres', table_name='Artist')
+    op.drop_index('ix_venue_genres', table_name='Venue')
@@ -0,0 +1,43 @@
+"""Trigram search indexes.
+
+Revision ID: 9b1f0c2d7e41
+Revises: 4c9b7b3019d8
+Create Date: 2026-10-18 10:12:31.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1f0c2d7e41'
+down_revision = '4c9b7b3019d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # array_to_string is only STABLE, an index expression needs an IMMUTABLE wrapper.
+    # OR REPLACE as search.py creates the same function on create_all databases
+    op.execute(
+        "CREATE OR REPLACE FUNCTION fyyur_genres_text(varchar[]) RETURNS text "
+        "AS $$ SELECT array_to_string($1, ' ') $$ LANGUAGE sql IMMUTABLE"
+    )
+    for table in ('Venue', 'Artist'):
+        prefix = 'ix_{}'.format(table.lower())
+        op.create_index(prefix + '_name_trgm', table, ['name'],
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index(prefix + '_city_trgm', table, ['city'],
+                        postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'})
+        op.create_index(prefix + '_genres_trgm', table, [sa.text('fyyur_genres_text(genres) gin_trgm_ops')],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        prefix = 'ix_{}'.format(table.lower())
+        op.drop_index(prefix + '_genres_trgm', table_name=table)
+        op.drop_index(prefix + '_city_trgm', table_name=table)
+        op.drop_index(prefix + '_name_trgm', table_name=table)
+    op.execute('DROP FUNCTION fyyur_genres_text(varchar[])')
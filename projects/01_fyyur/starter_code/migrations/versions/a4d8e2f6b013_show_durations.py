@@ -0,0 +1,47 @@
+"""Show durations and the venue double-booking constraint.
+
+Revision ID: a4d8e2f6b013
+Revises: 7f3b2a6c1e05
+Create Date: 2026-10-18 17:40:19.905362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d8e2f6b013'
+down_revision = '7f3b2a6c1e05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('duration_minutes', sa.Integer(), nullable=False, server_default='120'))
+    # existing shows get two hours, cut short where the venue's next show starts sooner,
+    # so the constraint below holds for the rows already there
+    op.execute(
+        "UPDATE shows SET duration_minutes = next_show.gap "
+        "FROM (SELECT id, floor(extract(epoch FROM lead(start_time) OVER ("
+        "PARTITION BY venue_id ORDER BY start_time, id) - start_time) / 60)::integer AS gap FROM shows) next_show "
+        "WHERE shows.id = next_show.id AND next_show.gap < 120"
+    )
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    # timestamp + interval is immutable for timestamp without time zone, so the
+    # period can be indexed
+    op.execute(
+        "CREATE OR REPLACE FUNCTION fyyur_show_period(timestamp, integer) RETURNS tsrange "
+        "AS $$ SELECT tsrange($1, $1 + $2 * interval '1 minute') $$ LANGUAGE sql IMMUTABLE"
+    )
+    # the GiST index behind this also answers the availability lookups
+    op.execute(
+        "ALTER TABLE shows ADD CONSTRAINT shows_venue_no_overlap EXCLUDE USING gist "
+        "(venue_id WITH =, fyyur_show_period(start_time, duration_minutes) WITH &&)"
+    )
+
+
+def downgrade():
+    op.execute('ALTER TABLE shows DROP CONSTRAINT shows_venue_no_overlap')
+    op.execute('DROP FUNCTION fyyur_show_period(timestamp, integer)')
+    op.drop_column('shows', 'duration_minutes')
@@ -0,0 +1,152 @@
+#--------------------------------------------------------------
+# Per-request SQL profiling and N+1 detection.
+#
+# Engine events time every statement a request runs and group them by
+# shape: the SQL with literals, bound parameters and IN lists collapsed,
+# so the same query for a different id counts as a repeat. A request that
+# repeats one shape more than repeat_threshold times is logged as a
+# likely N+1. Each response carries its query count and DB time in
+# headers, and per-route totals are kept for the debug endpoint.
+#--------------------------------------------------------------
+
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+TOP_SHAPES = 20
+# requests that matched no route share one entry, so stray paths can't grow the totals
+UNMATCHED = '<unmatched>'
+
+NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|:\w+|\$\d+|%s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def fingerprint(statement):
+    for pattern, replacement in NORMALIZE:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class RequestProfile:
+    '''
+    RequestProfile()
+        the statements of one request: count, time and repeats per shape
+    '''
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes = {}
+
+    def record(self, statement, seconds):
+        self.queries += 1
+        self.seconds += seconds
+        shape = fingerprint(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def most_repeated(self):
+        if not self.shapes:
+            return None, 0
+        return max(self.shapes.items(), key=lambda item: item[1])
+
+
+class SQLProfiler:
+    '''
+    SQLProfiler(repeat_threshold)
+        attach with init_app(app, engine). stats() returns the per-route
+        totals, reset() clears them
+    '''
+
+    def __init__(self, repeat_threshold=10):
+        self.repeat_threshold = repeat_threshold
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.logger = None
+
+    def init_app(self, app, engine):
+        self.logger = app.logger
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+        event.listen(engine, 'handle_error', self.handle_error)
+        app.before_request(self.begin)
+        app.after_request(self.end)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profiler_started'].pop()
+        if has_request_context():
+            profile = g.get('sql_profile')
+            if profile is not None:
+                profile.record(statement, time.perf_counter() - started)
+
+    def handle_error(self, context):
+        # a failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.cursor is not None:
+            started = context.connection.info.get('profiler_started')
+            if started:
+                started.pop()
+
+    def begin(self):
+        g.sql_profile = RequestProfile()
+
+    def end(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+
+        shape, repeats = profile.most_repeated()
+        if repeats > self.repeat_threshold:
+            self.logger.warning('%s %s ran the same statement %d times (likely N+1): %s',
+                                request.method, request.path, repeats, shape)
+
+        milliseconds = profile.seconds * 1000
+        response.headers['X-SQL-Queries'] = str(profile.queries)
+        response.headers['X-SQL-Time'] = '{:.2f}'.format(milliseconds)
+        response.headers['X-SQL-Max-Repeats'] = str(repeats)
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(milliseconds, profile.queries))
+        self.collect(request.endpoint or UNMATCHED, profile, repeats)
+        return response
+
+    def collect(self, route, profile, repeats):
+        with self.lock:
+            stats = self.routes.setdefault(route, {
+                'requests': 0, 'queries': 0, 'db_time_ms': 0.0,
+                'max_queries': 0, 'n_plus_one_requests': 0, 'shapes': {}
+            })
+            stats['requests'] += 1
+            stats['queries'] += profile.queries
+            stats['db_time_ms'] += profile.seconds * 1000
+            stats['max_queries'] = max(stats['max_queries'], profile.queries)
+            if repeats > self.repeat_threshold:
+                stats['n_plus_one_requests'] += 1
+            for shape, count in profile.shapes.items():
+                seen = stats['shapes'].setdefault(shape, {'executions': 0, 'max_per_request': 0})
+                seen['executions'] += count
+                seen['max_per_request'] = max(seen['max_per_request'], count)
+
+    def stats(self):
+        with self.lock:
+            routes = {}
+            for route, stats in self.routes.items():
+                shapes = sorted(stats['shapes'].items(), key=lambda item: -item[1]['max_per_request'])
+                routes[route] = dict(
+                    stats,
+                    avg_queries=stats['queries'] / stats['requests'],
+                    avg_db_time_ms=stats['db_time_ms'] / stats['requests'],
+                    shapes=[dict(seen, statement=shape) for shape, seen in shapes[:TOP_SHAPES]]
+                )
+        return {'repeat_threshold': self.repeat_threshold, 'routes': routes}
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
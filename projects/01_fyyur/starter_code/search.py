@@ -0,0 +1,212 @@
+#--------------------------------------------------------------
+# Relevance ranked search over venue and artist names, cities and genres.
+#
+# On Postgres the match and the ranking run in the database against the
+# pg_trgm GIN indexes added by migration 9b1f0c2d7e41. Other databases
+# (SQLite, test databases) fall back to an in-process n-gram index that
+# is built on first use and kept current as sessions commit.
+#--------------------------------------------------------------
+
+import re
+import threading
+
+from sqlalchemy import DDL, event, func, or_
+from sqlalchemy.orm import Session, object_session
+
+# how much a match in each field counts towards the rank
+FIELD_WEIGHTS = {'name': 1.0, 'city': 0.8, 'genres': 0.6}
+
+# ids per IN (...) clause when the fallback index hands matches to the database
+ID_CHUNK_SIZE = 500
+
+WORD_RE = re.compile(r'\w+')
+
+# what the Postgres branch needs, the same statements as the migration, for
+# databases made with create_all
+SEARCH_DDL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE OR REPLACE FUNCTION fyyur_genres_text(varchar[]) RETURNS text "
+    "AS $$ SELECT array_to_string($1, ' ') $$ LANGUAGE sql IMMUTABLE",
+)
+
+
+def field_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return ' '.join(value)
+    return value
+
+
+def word_score(term, text):
+    # 1.0 when term is a whole word of text, otherwise the share of the
+    # shortest word containing it; mirrors pg_trgm's word_similarity closely
+    # enough for ordering
+    best = 0.0
+    for word in WORD_RE.findall(text):
+        if term in word:
+            best = max(best, len(term) / len(word))
+    if not best and term in text:
+        best = len(term) / len(text)
+    return best
+
+
+class NgramIndex:
+    '''
+    NgramIndex
+        maps every 1..n character gram of the indexed text to the ids that
+        contain it. A lookup intersects the posting lists of the term's
+        longest grams and then confirms the substring match, so it returns
+        exactly what ILIKE '%term%' would.
+    '''
+
+    def __init__(self, weights=FIELD_WEIGHTS, n=3):
+        self.weights = weights
+        self.n = n
+        self.docs = {}
+        self.postings = {}
+
+    def grams(self, text, size):
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def add(self, id, fields):
+        self.remove(id)
+        doc = {name: field_text(fields.get(name)).lower() for name in self.weights}
+        self.docs[id] = doc
+        for text in doc.values():
+            for size in range(1, self.n + 1):
+                for gram in self.grams(text, size):
+                    self.postings.setdefault(gram, set()).add(id)
+
+    def remove(self, id):
+        doc = self.docs.pop(id, None)
+        if doc is None:
+            return
+        for text in doc.values():
+            for size in range(1, self.n + 1):
+                for gram in self.grams(text, size):
+                    ids = self.postings.get(gram)
+                    if ids is not None:
+                        ids.discard(id)
+                        if not ids:
+                            del self.postings[gram]
+
+    def search(self, term):
+        term = term.lower().strip()
+        if not term:
+            candidates = set(self.docs)
+        else:
+            size = min(len(term), self.n)
+            lists = sorted((self.postings.get(gram, set()) for gram in self.grams(term, size)), key=len)
+            candidates = set.intersection(*lists) if lists else set()
+
+        ranked = []
+        for id in candidates:
+            doc = self.docs[id]
+            score = 0.0
+            for name, weight in self.weights.items():
+                if term in doc[name]:
+                    score = max(score, weight * word_score(term, doc[name]) if term else weight)
+            if score:
+                ranked.append((-score, doc['name'], id))
+        ranked.sort()
+        return [id for _, _, id in ranked]
+
+
+class ModelSearch:
+    '''
+    ModelSearch(db, model)
+        searches model rows whose name, city or genres contain the term,
+        most relevant first
+    '''
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self.index = None
+        self.lock = threading.Lock()
+        self.pending_key = 'model_search_' + model.__tablename__
+        for statement in SEARCH_DDL:
+            event.listen(model.__table__, 'before_create', DDL(statement).execute_if(dialect='postgresql'))
+        for name in ('after_insert', 'after_update'):
+            event.listen(model, name, self.on_change)
+        event.listen(model, 'after_delete', self.on_delete)
+        event.listen(Session, 'after_commit', self.on_commit)
+        event.listen(Session, 'after_rollback', self.on_rollback)
+
+    def uses_database(self):
+        return self.db.engine.dialect.name == 'postgresql'
+
+    def fields(self, row):
+        return {name: getattr(row, name) for name in FIELD_WEIGHTS}
+
+    def queue(self, target, change):
+        # applied to the index once the session commits, dropped on rollback
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(self.pending_key, []).append(change)
+
+    def on_change(self, mapper, connection, target):
+        self.queue(target, (target.id, self.fields(target)))
+
+    def on_delete(self, mapper, connection, target):
+        self.queue(target, (target.id, None))
+
+    def on_commit(self, session):
+        changes = session.info.pop(self.pending_key, None)
+        if not changes:
+            return
+        with self.lock:
+            if self.index is None:
+                return
+            for id, fields in changes:
+                if fields is None:
+                    self.index.remove(id)
+                else:
+                    self.index.add(id, fields)
+
+    def on_rollback(self, session):
+        session.info.pop(self.pending_key, None)
+
+    def build_index(self):
+        with self.lock:
+            if self.index is None:
+                index = NgramIndex()
+                columns = [getattr(self.model, name) for name in FIELD_WEIGHTS]
+                for row in self.db.session.query(self.model.id, *columns).yield_per(ID_CHUNK_SIZE):
+                    index.add(row.id, row._asdict())
+                self.index = index
+        return self.index
+
+    def reset(self):
+        # drops the fallback index, e.g. after rows were bulk loaded
+        with self.lock:
+            self.index = None
+
+    def search(self, query, term):
+        '''
+        search(query, term)
+            query selects from the model and includes its id column
+            returns the rows of query matching term, ranked by relevance
+        '''
+        model = self.model
+        if self.uses_database():
+            pattern = '%' + term + '%'
+            genres = func.fyyur_genres_text(model.genres)
+            rank = func.greatest(
+                func.word_similarity(term, model.name) * FIELD_WEIGHTS['name'],
+                func.word_similarity(term, model.city) * FIELD_WEIGHTS['city'],
+                func.word_similarity(term, genres) * FIELD_WEIGHTS['genres']
+            )
+            return query.\
+                filter(or_(model.name.ilike(pattern), model.city.ilike(pattern), genres.ilike(pattern))).\
+                order_by(rank.desc(), model.name).\
+                all()
+
+        ids = self.build_index().search(term)
+        position = {id: n for n, id in enumerate(ids)}
+        rows = []
+        for start in range(0, len(ids), ID_CHUNK_SIZE):
+            rows.extend(query.filter(model.id.in_(ids[start:start + ID_CHUNK_SIZE])).all())
+        rows.sort(key=lambda row: position[row.id])
+        return rows
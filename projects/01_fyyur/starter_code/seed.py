@@ -0,0 +1,142 @@
+#--------------------------------------------------------------
+# Seeds the configured database with a large synthetic dataset.
+#
+#   python seed.py --venues 100000 --artists 100000 --shows 1000000
+#
+# Point DATABASE_URL at a scratch database, the tables are filled
+# with bulk inserts and nothing is cleared beforehand.
+#--------------------------------------------------------------
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from app import app, db, artist_facets, show_calendar, show_counters, venue_facets, Venue, Artist, Shows
+
+BATCH_SIZE = 10000
+
+SAMPLE_VENUES = ['The Musical Hop', 'The Dueling Pianos Bar', 'Park Square Live Music & Coffee']
+SAMPLE_ARTISTS = ['Guns N Petals', 'Matt Quevado', 'The Wild Sax Band']
+
+WORDS = [
+    'Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Rusty', 'Silver', 'Lucky',
+    'Crimson', 'Neon', 'Hollow', 'Wild', 'Quiet', 'Broken', 'Lonely', 'Brass'
+]
+VENUE_NOUNS = ['Room', 'Lounge', 'Hall', 'Tavern', 'Garden', 'Club', 'Theater', 'Cellar']
+ARTIST_NOUNS = ['Trio', 'Collective', 'Orchestra', 'Quartet', 'Kids', 'Brothers', 'Project', 'Ensemble']
+AREAS = [
+    ('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Chicago', 'IL'),
+    ('Seattle', 'WA'), ('Nashville', 'TN'), ('New Orleans', 'LA'), ('Denver', 'CO')
+]
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+    'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+    'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Swing', 'Other'
+]
+
+
+def make_name(rng, nouns, n):
+    return '{} {} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), rng.choice(nouns), n)
+
+
+def venue_rows(rng, count):
+    for n in range(count):
+        city, state = rng.choice(AREAS)
+        yield {
+            'name': SAMPLE_VENUES[n] if n < len(SAMPLE_VENUES) else make_name(rng, VENUE_NOUNS, n),
+            'city': city,
+            'state': state,
+            'address': '{} Main Street'.format(rng.randint(1, 9999)),
+            'phone': '555-{:03d}-{:04d}'.format(rng.randint(0, 999), rng.randint(0, 9999)),
+            'genres': rng.sample(GENRES, rng.randint(1, 4)),
+            'seeking_talent': rng.random() < 0.5,
+            'seeking_description': ''
+        }
+
+
+def artist_rows(rng, count):
+    for n in range(count):
+        city, state = rng.choice(AREAS)
+        yield {
+            'name': SAMPLE_ARTISTS[n] if n < len(SAMPLE_ARTISTS) else make_name(rng, ARTIST_NOUNS, n),
+            'city': city,
+            'state': state,
+            'phone': '555-{:03d}-{:04d}'.format(rng.randint(0, 999), rng.randint(0, 9999)),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'seeking_venue': rng.random() < 0.5,
+            'seeking_description': ''
+        }
+
+
+def show_rows(rng, count, venue_ids, artist_ids, now):
+    # shows are spread over a year either side of now, in three hour slots
+    # so that no venue is double booked (see availability.py). each venue's
+    # slots are drawn without replacement by a Fisher-Yates shuffle that only
+    # remembers the positions it swapped
+    slots = 365 * 8
+    open_venues = list(venue_ids)
+    swapped = {}
+    remaining = {}
+    for n in range(count):
+        if not open_venues:
+            raise ValueError('{} shows do not fit in the free slots of {} venues'.format(count, len(venue_ids)))
+        index = rng.randrange(len(open_venues))
+        venue_id = open_venues[index]
+        moved = swapped.setdefault(venue_id, {})
+        left = remaining.get(venue_id, 2 * slots + 1)
+        pick = rng.randrange(left)
+        slot = moved.get(pick, pick) - slots
+        moved[pick] = moved.get(left - 1, left - 1)
+        remaining[venue_id] = left - 1
+        if left == 1:
+            # fully booked, stop choosing it
+            open_venues[index] = open_venues[-1]
+            open_venues.pop()
+        yield {
+            'venue_id': venue_id,
+            'artist_id': rng.choice(artist_ids),
+            'start_time': now + timedelta(hours=3 * slot, minutes=rng.choice((0, 30, 60))),
+            'duration_minutes': 120
+        }
+
+
+def insert_batches(model, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.bulk_insert_mappings(model, batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.bulk_insert_mappings(model, batch)
+        db.session.commit()
+
+
+def seed(venues=1000, artists=1000, shows=10000, random_seed=0):
+    rng = random.Random(random_seed)
+    insert_batches(Venue, venue_rows(rng, venues))
+    insert_batches(Artist, artist_rows(rng, artists))
+    venue_facets.rebuild()
+    artist_facets.rebuild()
+
+    venue_ids = [row.id for row in db.session.query(Venue.id)]
+    artist_ids = [row.id for row in db.session.query(Artist.id)]
+    if shows and venue_ids and artist_ids:
+        insert_batches(Shows, show_rows(rng, shows, venue_ids, artist_ids, datetime.now()))
+        # bulk inserts skip the mapper events that keep the show counts
+        show_counters.rebuild()
+        show_calendar.reset()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seed the Fyyur database with synthetic data.')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(args.venues, args.artists, args.shows, args.seed)
@@ -0,0 +1,128 @@
+#--------------------------------------------------------------
+# Stored upcoming/past show counts on venues and artists.
+#
+# A show counts as past once its start_time is at or before the sweep
+# mark kept in show_count_sweep, and as upcoming until then. Inserting
+# or deleting a show through the ORM moves the counters of its venue and
+# artist in the same transaction, classified against that mark. sweep()
+# advances the mark to now and moves only the shows that started in
+# between from upcoming to past, so a run costs as much as the shows it
+# crosses rather than the whole table. Bulk inserts skip the mapper
+# events and are followed by rebuild().
+#--------------------------------------------------------------
+
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam, event, func, select
+
+
+class ShowCounters:
+    '''
+    ShowCounters(db, shows, venue, artist, sweep)
+        keeps upcoming_shows_count and past_shows_count of venue and
+        artist in step with shows. sweep is the single row model holding
+        the mark
+    '''
+
+    def __init__(self, db, shows, venue, artist, sweep):
+        self.db = db
+        self.shows = shows.__table__
+        self.sweep_table = sweep.__table__
+        # (shows column pointing at the parent, parent table)
+        self.parents = [
+            (self.shows.c.venue_id, venue.__table__),
+            (self.shows.c.artist_id, artist.__table__),
+        ]
+        event.listen(shows, 'after_insert', self.on_insert)
+        event.listen(shows, 'after_delete', self.on_delete)
+
+    def swept_until(self, connection, lock=False):
+        # FOR SHARE while classifying a show, FOR UPDATE while moving the mark,
+        # so a show is never counted against a mark that is being replaced
+        query = select([self.sweep_table.c.swept_until]).where(self.sweep_table.c.id == 1)
+        if lock:
+            query = query.with_for_update(read=lock == 'share')
+        return connection.execute(query).scalar()
+
+    def column(self, start_time, swept_until):
+        # before the first sweep there is no mark and now stands in for it
+        if start_time <= (swept_until or datetime.now()):
+            return 'past_shows_count'
+        return 'upcoming_shows_count'
+
+    def adjust(self, connection, target, step):
+        name = self.column(target.start_time, self.swept_until(connection, lock='share'))
+        for column, table in self.parents:
+            counter = table.c[name]
+            connection.execute(
+                table.update().
+                where(table.c.id == getattr(target, column.name)).
+                values({counter: counter + step})
+            )
+
+    def on_insert(self, mapper, connection, target):
+        self.adjust(connection, target, 1)
+
+    def on_delete(self, mapper, connection, target):
+        self.adjust(connection, target, -1)
+
+    def sweep(self, now=None):
+        '''
+        sweep(now)
+            moves shows that started since the last sweep from upcoming to
+            past. returns {'venue_id': [...], 'artist_id': [...]}, the ids
+            whose counters changed, or None when there was no mark yet
+            and every counter was rebuilt
+        '''
+        now = now or datetime.now()
+        changed = {column.name: [] for column, _ in self.parents}
+        with self.db.engine.begin() as connection:
+            since = self.swept_until(connection, lock='update')
+            if since is None:
+                self.rebuild_counts(connection, now)
+                return None
+            if now <= since:
+                return changed
+
+            shows = self.shows
+            for column, table in self.parents:
+                crossed = connection.execute(
+                    select([column, func.count()]).
+                    where(and_(shows.c.start_time > since, shows.c.start_time <= now)).
+                    group_by(column)
+                ).fetchall()
+                if not crossed:
+                    continue
+                connection.execute(
+                    table.update().
+                    where(table.c.id == bindparam('parent_id')).
+                    values(
+                        upcoming_shows_count=table.c.upcoming_shows_count - bindparam('crossed'),
+                        past_shows_count=table.c.past_shows_count + bindparam('crossed')
+                    ),
+                    [{'parent_id': id, 'crossed': count} for id, count in crossed]
+                )
+                changed[column.name] = [id for id, _ in crossed]
+
+            connection.execute(self.sweep_table.update().where(self.sweep_table.c.id == 1).values(swept_until=now))
+        return changed
+
+    def rebuild(self, now=None):
+        # recounts every venue and artist, e.g. after shows were bulk inserted
+        with self.db.engine.begin() as connection:
+            self.swept_until(connection, lock='update')
+            self.rebuild_counts(connection, now or datetime.now())
+
+    def rebuild_counts(self, connection, now):
+        shows = self.shows
+        for column, table in self.parents:
+            def count(condition):
+                return select([func.count()]).where(and_(column == table.c.id, condition)).as_scalar()
+            connection.execute(table.update().values(
+                upcoming_shows_count=count(shows.c.start_time > now),
+                past_shows_count=count(shows.c.start_time <= now)
+            ))
+
+        sweep = self.sweep_table
+        if connection.execute(sweep.update().where(sweep.c.id == 1).values(swept_until=now)).rowcount == 0:
+            connection.execute(sweep.insert().values(id=1, swept_until=now))
@@ -0,0 +1,629 @@
+import io
+import json
+import logging
+import os
+import random
+import socketserver
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur_test')
+os.environ.setdefault('SQL_PROFILER', '1')
+os.environ.setdefault('SQL_PROFILER_ENDPOINT', '1')
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+
+from app import app, db, artist_facets, response_cache, show_calendar, show_counters, sql_profiler, venue_facets, Venue, Artist, Shows
+from availability import IntervalTree
+from cache import MemcachedCache, ResponseCache
+from search import NgramIndex
+from logqueue import JSONFormatter, LogWriter, QueueHandler, RequestFilter
+import seed
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        app.config['TESTING'] = True
+        self.client = app.test_client
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        response_cache.clear()
+        response_cache.reset_stats()
+        venue_facets.reset()
+        artist_facets.reset()
+        show_calendar.reset()
+
+        now = self.now = datetime.now().replace(microsecond=0)
+        venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                      genres=['Jazz'], seeking_description='')
+        artist = Artist(name='Guns N Petals', city='San Francisco', state='CA',
+                        genres=['Rock n Roll'], seeking_description='')
+        db.session.add_all([venue, artist])
+        db.session.flush()
+        db.session.add_all([
+            Shows(venue_id=venue.id, artist_id=artist.id, start_time=now - timedelta(days=1)),
+            Shows(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=1)),
+        ])
+        db.session.commit()
+        self.venue_id = venue.id
+        self.artist_id = artist.id
+
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record_statement)
+
+    def tearDown(self):
+        """Executed after reach test"""
+        event.remove(db.engine, 'before_cursor_execute', self.record_statement)
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def get(self, path):
+        del self.statements[:]
+        res = self.client().get(path)
+        self.assertEqual(res.status_code, 200)
+        return res
+
+    def test_venues_list_does_not_load_shows(self):
+        res = self.get('/venues')
+        self.statements = [statement for statement in self.statements if 'genre_counts' not in statement]
+
+        self.assertIn(b'The Musical Hop', res.data)
+        self.assertEqual(len(self.statements), 1)
+        # upcoming shows are counted in SQL, no show columns are selected
+        self.assertNotIn('AS shows_', self.statements[0])
+
+    def test_artists_list_does_not_load_shows(self):
+        res = self.get('/artists')
+        self.statements = [statement for statement in self.statements if 'genre_counts' not in statement]
+
+        self.assertIn(b'Guns N Petals', res.data)
+        self.assertEqual(len(self.statements), 1)
+        self.assertNotIn('shows', self.statements[0].lower())
+
+    def test_venues_grouped_by_area(self):
+        db.session.add_all([
+            Venue(name='Park Square Live Music & Coffee', city='San Francisco', state='CA', seeking_description=''),
+            Venue(name='The Dueling Pianos Bar', city='New York', state='NY', seeking_description=''),
+            Venue(name='Another Hop', city='San Francisco', state='CA', seeking_description=''),
+        ])
+        db.session.commit()
+
+        res = self.get('/venues')
+
+        self.assertEqual(res.data.count(b'San Francisco, CA'), 1)
+        self.assertEqual(res.data.count(b'New York, NY'), 1)
+        self.assertLess(res.data.index(b'San Francisco, CA'), res.data.index(b'New York, NY'))
+
+    def test_venue_detail_is_one_query(self):
+        res = self.get('/venues/{}'.format(self.venue_id))
+
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn(b'1 Upcoming Show', res.data)
+        self.assertIn(b'1 Past Show', res.data)
+        self.assertIn(b'Guns N Petals', res.data)
+
+    def test_artist_detail_lists_venues_for_upcoming_shows(self):
+        res = self.get('/artists/{}'.format(self.artist_id))
+
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn(b'1 Upcoming Show', res.data)
+        self.assertIn(b'1 Past Show', res.data)
+        self.assertEqual(res.data.count('href="/venues/{}"'.format(self.venue_id).encode()), 2)
+
+    def test_show_creation_evicts_cached_pages(self):
+        self.get('/venues/{}'.format(self.venue_id))
+        res = self.get('/venues/{}'.format(self.venue_id))
+        self.assertEqual(res.headers['X-Cache'], 'HIT')
+        self.assertEqual(len(self.statements), 0)
+
+        self.client().post('/shows/create', data={
+            'venue_id': self.venue_id,
+            'artist_id': self.artist_id,
+            'start_time': '2100-01-01 20:00:00'
+        })
+        res = self.get('/venues/{}'.format(self.venue_id))
+
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        self.assertIn(b'2 Upcoming Shows', res.data)
+        stats = response_cache.stats()['routes']['venue']
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 2, 1))
+
+    def test_show_counts_follow_creation_and_sweeps(self):
+        now = datetime.now()
+        self.assertIsNone(show_counters.sweep(now))
+        self.client().post('/shows/create', data={
+            'venue_id': self.venue_id,
+            'artist_id': self.artist_id,
+            'start_time': (now + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+        })
+        venue = Venue.query.get(self.venue_id)
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (2, 1))
+
+        changed = show_counters.sweep(now + timedelta(hours=2))
+        self.assertEqual(changed, {'venue_id': [self.venue_id], 'artist_id': [self.artist_id]})
+        self.assertEqual(show_counters.sweep(now + timedelta(hours=3)), {'venue_id': [], 'artist_id': []})
+
+        db.session.expire_all()
+        venue = Venue.query.get(self.venue_id)
+        artist = Artist.query.get(self.artist_id)
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (1, 2))
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (1, 2))
+
+    def test_search_reads_stored_counts(self):
+        del self.statements[:]
+        res = self.client().post('/venues/search', data={'search_term': 'hop'})
+
+        self.assertIn(b'The Musical Hop', res.data)
+        self.assertTrue(self.statements)
+        for statement in self.statements:
+            self.assertNotIn('JOIN shows', statement)
+            self.assertNotIn('FROM shows', statement)
+
+    def test_genre_facets_filter_and_count(self):
+        db.session.add_all([
+            Artist(name='Blue Trio', city='San Francisco', state='CA', genres=['Jazz', 'Blues'], seeking_description=''),
+            Artist(name='Brass Kids', city='San Francisco', state='CA', genres=['Jazz'], seeking_description=''),
+            Artist(name='Neon Project', city='New York', state='NY', genres=['Jazz'], seeking_description=''),
+        ])
+        db.session.commit()
+        self.assertEqual(artist_facets.counts('CA', 'San Francisco'),
+                         [('Jazz', 2), ('Blues', 1), ('Rock n Roll', 1)])
+
+        res = self.get('/artists?genre=Jazz&state=CA&city=San+Francisco')
+        self.assertIn(b'Blue Trio', res.data)
+        self.assertIn(b'Brass Kids', res.data)
+        self.assertNotIn(b'Neon Project', res.data)
+        self.assertNotIn(b'Guns N Petals', res.data)
+        self.assertIn(b'Jazz (2)', res.data)
+
+        # cached counts follow updates and deletes without going back to the table
+        artist = Artist.query.filter_by(name='Brass Kids').one()
+        artist.genres = ['Blues']
+        db.session.commit()
+        db.session.delete(Artist.query.filter_by(name='Blue Trio').one())
+        db.session.commit()
+        del self.statements[:]
+        self.assertEqual(artist_facets.counts('CA', 'San Francisco'), [('Blues', 1), ('Rock n Roll', 1)])
+        self.assertEqual(self.statements, [])
+        artist_facets.reset()
+        self.assertEqual(artist_facets.counts(), [('Blues', 1), ('Jazz', 1), ('Rock n Roll', 1)])
+
+        res = self.client().post('/artists/search', data={'search_term': 'o', 'genre': 'Blues'})
+        self.assertIn(b'Brass Kids', res.data)
+        self.assertNotIn(b'Neon Project', res.data)
+        self.assertIn(b'Blues (1)', res.data)
+
+    def test_double_bookings_are_rejected(self):
+        def book(start, minutes):
+            self.client().post('/shows/create', data={
+                'venue_id': self.venue_id,
+                'artist_id': self.artist_id,
+                'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+                'duration_minutes': minutes
+            })
+            return Shows.query.filter_by(venue_id=self.venue_id).count()
+
+        booked = self.now + timedelta(days=1)
+        self.assertEqual(book(booked + timedelta(minutes=90), 60), 2)
+        self.assertEqual(book(booked - timedelta(minutes=30), 31), 2)
+        self.assertEqual(book(booked + timedelta(minutes=120), 60), 3)
+        self.assertEqual(book(booked - timedelta(minutes=30), 30), 4)
+
+    def test_available_venues(self):
+        db.session.add_all([
+            Venue(name='Park Square Live Music & Coffee', city='San Francisco', state='CA', seeking_description=''),
+            Venue(name='The Dueling Pianos Bar', city='New York', state='NY', seeking_description=''),
+        ])
+        db.session.commit()
+        booked = self.now + timedelta(days=1)
+
+        res = self.get('/venues/available?city=San+Francisco&start={}&duration=60'.format(
+            (booked + timedelta(minutes=30)).isoformat()))
+        self.assertIn(b'Park Square Live Music', res.data)
+        self.assertNotIn(b'The Musical Hop', res.data)
+        self.assertNotIn(b'Dueling Pianos', res.data)
+
+        res = self.get('/venues/available?city=San+Francisco&start={}&end={}'.format(
+            (booked + timedelta(hours=2)).isoformat(), (booked + timedelta(hours=4)).isoformat()))
+        self.assertIn(b'The Musical Hop', res.data)
+
+        res = self.client().get('/venues/available?start={0}&end={0}'.format(booked.isoformat()))
+        self.assertEqual(res.status_code, 400)
+
+    def test_genre_filter_uses_array_containment_on_postgres(self):
+        with mock.patch.object(venue_facets, 'uses_database', return_value=True):
+            query = venue_facets.filter(db.session.query(Venue.id), ['Jazz', 'Blues'])
+        compiled = query.statement.compile(dialect=postgresql.dialect())
+
+        # genres @> ARRAY[...] is what the GIN index answers
+        self.assertIn('"Venue".genres @> %(genres_1)s', str(compiled))
+        self.assertEqual(compiled.params['genres_1'], ['Jazz', 'Blues'])
+
+    def test_search_index_ignores_rolled_back_changes(self):
+        def search(term):
+            res = self.client().post('/venues/search', data={'search_term': term})
+            return 'href="/venues/{}"'.format(self.venue_id).encode() in res.data
+
+        self.assertTrue(search('musical'))
+        venue = Venue.query.get(self.venue_id)
+        venue.name = 'Renamed Room'
+        db.session.flush()
+        db.session.rollback()
+        self.assertTrue(search('musical'))
+        self.assertFalse(search('renamed'))
+
+        Venue.query.get(self.venue_id).name = 'Renamed Room'
+        db.session.commit()
+        self.assertFalse(search('musical'))
+        self.assertTrue(search('renamed'))
+
+        db.session.add(Venue(name='Musical Cellar', city='Austin', state='TX', seeking_description=''))
+        db.session.commit()
+        res = self.client().post('/venues/search', data={'search_term': 'cellar'})
+        self.assertIn(b'Musical Cellar', res.data)
+        db.session.delete(Venue.query.filter_by(name='Musical Cellar').one())
+        db.session.commit()
+        res = self.client().post('/venues/search', data={'search_term': 'cellar'})
+        self.assertNotIn(b'Musical Cellar', res.data)
+
+    def test_import_venues_reports_bad_rows(self):
+        data = (
+            'name,city,state,address,genres,facebook_link,website,seeking_talent\n'
+            'Quiet Room,New York,NY,2 Main St,"Folk,Jazz",https://fb.com/q,https://q.com,yes\n'
+            'Nowhere,New York,ZZ,3 Main St,Folk,https://fb.com/n,https://n.com,no\n'
+        )
+        res = self.client().post('/import/venues', data={'file': (io.BytesIO(data.encode()), 'venues.csv')})
+        report = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual(report['errors'], [{'line': 3, 'errors': {'state': ['Not a valid choice']}}])
+        venue = Venue.query.filter_by(name='Quiet Room').one()
+        self.assertEqual(venue.genres, ['Folk', 'Jazz'])
+        self.assertTrue(venue.seeking_talent)
+
+    def test_import_shows_rejects_double_bookings(self):
+        booked = self.now + timedelta(days=1, minutes=30)
+        free = self.now + timedelta(days=3)
+        data = 'venue_id,artist_id,start_time,duration_minutes\n' + ''.join(
+            '{},{},{:%Y-%m-%d %H:%M:%S},60\n'.format(self.venue_id, self.artist_id, start)
+            for start in (booked, free, free + timedelta(minutes=30))
+        )
+        res = self.client().post('/import/shows', data={'file': (io.BytesIO(data.encode()), 'shows.csv')})
+        report = json.loads(res.data)
+
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual([error['line'] for error in report['errors']], [2, 4])
+        self.assertIn('already has a show', report['errors'][0]['errors']['start_time'][0])
+        self.assertEqual(Shows.query.filter_by(venue_id=self.venue_id).count(), 3)
+
+    def test_import_json_skips_malformed_objects(self):
+        data = json.dumps([
+            {'name': 'Quiet Room', 'city': 'New York', 'state': 'NY', 'address': '2 Main St', 'genres': ['Folk'],
+             'facebook_link': 'https://fb.com/q', 'website': 'https://q.com'}
+        ])[:-1] + ', {"name": "Broken \\" {", "city" "New York"}, ' + json.dumps(
+            {'name': 'Loud Room', 'city': 'New York', 'state': 'NY', 'address': '4 Main St', 'genres': ['Jazz'],
+             'facebook_link': 'https://fb.com/l', 'website': 'https://l.com'}
+        ) + ']'
+        with mock.patch('importer.CHUNK_SIZE', 16):
+            res = self.client().post('/import/venues', data={'file': (io.BytesIO(data.encode()), 'venues.json')})
+        report = json.loads(res.data)
+
+        self.assertEqual(report['inserted'], 2)
+        self.assertEqual([error['line'] for error in report['errors']], [2])
+        self.assertIn('invalid JSON object', report['errors'][0]['errors']['row'][0])
+        self.assertEqual(Venue.query.filter(Venue.name.in_(['Quiet Room', 'Loud Room'])).count(), 2)
+
+    def test_responses_report_sql_profile(self):
+        sql_profiler.reset()
+        res = self.get('/venues/{}'.format(self.venue_id))
+        queries = len(self.statements)
+
+        self.assertEqual(res.headers['X-SQL-Queries'], str(queries))
+        self.assertIn('X-SQL-Time', res.headers)
+        self.assertIn('db;dur=', res.headers['Server-Timing'])
+
+        stats = json.loads(self.get('/debug/sql').data)['routes']['show_venue']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['queries'], queries)
+
+    def test_unmatched_paths_share_one_sql_profile(self):
+        sql_profiler.reset()
+        for path in ('/no/such/page', '/another/missing/page'):
+            self.assertEqual(self.client().get(path).status_code, 404)
+
+        routes = sql_profiler.stats()['routes']
+        self.assertEqual(list(routes), ['<unmatched>'])
+        self.assertEqual(routes['<unmatched>']['requests'], 2)
+
+    def test_repeated_statements_are_flagged(self):
+        sql_profiler.reset()
+        with app.test_request_context('/venues'), \
+                self.assertLogs(app.logger, 'WARNING') as logs:
+            sql_profiler.begin()
+            for venue_id in range(sql_profiler.repeat_threshold + 1):
+                Venue.query.get(venue_id + 1000)
+            res = sql_profiler.end(app.response_class())
+
+        self.assertEqual(res.headers['X-SQL-Max-Repeats'], str(sql_profiler.repeat_threshold + 1))
+        self.assertIn('likely N+1', logs.output[0])
+        shape = sql_profiler.stats()['routes']['venues']['shapes'][0]
+        self.assertEqual(shape['max_per_request'], sql_profiler.repeat_threshold + 1)
+        self.assertIn('WHERE "Venue".id = ?', shape['statement'])
+
+    def test_detail_for_missing_venue(self):
+        res = self.client().get('/venues/1000')
+
+        self.assertEqual(res.status_code, 404)
+
+
+class NgramIndexTestCase(unittest.TestCase):
+    """This class represents the in-process search index test case"""
+
+    def setUp(self):
+        self.index = NgramIndex()
+        self.index.add(1, {'name': 'Jazz Hall', 'city': 'Austin', 'genres': ['Rock']})
+        self.index.add(2, {'name': 'Jazzy Club', 'city': 'Denver', 'genres': ['Folk']})
+        self.index.add(3, {'name': 'Blue Room', 'city': 'Jazzville', 'genres': ['Soul']})
+        self.index.add(4, {'name': 'Quiet Bar', 'city': 'Austin', 'genres': ['Jazz']})
+
+    def test_ranks_by_field_weight_and_word_match(self):
+        # whole word in the name, part of a word in the name, whole genre, part of the city
+        self.assertEqual(self.index.search('Jazz'), [1, 2, 4, 3])
+
+    def test_terms_shorter_than_the_grams(self):
+        self.assertEqual(sorted(self.index.search('z')), [1, 2, 3, 4])
+        self.assertEqual(self.index.search('qu'), [4])
+        self.assertEqual(sorted(self.index.search('  ')), [1, 2, 3, 4])
+
+    def test_follows_inserts_updates_and_deletes(self):
+        self.index.add(5, {'name': 'Brass Cellar', 'city': 'Austin', 'genres': None})
+        self.assertEqual(self.index.search('cellar'), [5])
+
+        self.index.add(5, {'name': 'Brass Attic', 'city': 'Austin', 'genres': None})
+        self.assertEqual(self.index.search('cellar'), [])
+        self.assertEqual(self.index.search('attic'), [5])
+
+        self.index.remove(5)
+        self.index.remove(1)
+        self.assertEqual(self.index.search('attic'), [])
+        self.assertEqual(self.index.search('Jazz'), [2, 4, 3])
+        self.assertNotIn('cel', self.index.postings)
+
+
+class IntervalTreeTestCase(unittest.TestCase):
+    """This class checks the availability interval tree against a linear scan"""
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(0)
+        tree = IntervalTree()
+        intervals = {}
+        for id in range(2000):
+            start = rng.randint(0, 10000)
+            intervals[id] = (start, start + rng.randint(0, 50))
+            tree.add(*intervals[id], id)
+        for id in rng.sample(sorted(intervals), 500):
+            self.assertTrue(tree.remove(*intervals.pop(id), id))
+        self.assertEqual(len(tree), 1500)
+
+        for _ in range(200):
+            start = rng.randint(-100, 10100)
+            end = start + rng.randint(1, 200)
+            expected = sorted(id for id, (s, e) in intervals.items() if s < end and start < e and s < e)
+            self.assertEqual(sorted(tree.overlapping(start, end)), expected)
+
+    def test_bulk_build_matches_inserts(self):
+        rng = random.Random(1)
+        intervals = []
+        for id in range(1000):
+            start = rng.randint(0, 5000)
+            intervals.append((start, start + rng.randint(0, 30), id))
+        tree = IntervalTree.from_sorted(sorted(intervals))
+        tree.add(2500, 2600, 1000)
+        intervals.append((2500, 2600, 1000))
+        self.assertEqual(len(tree), 1001)
+
+        for start in range(0, 5000, 37):
+            expected = sorted(id for s, e, id in intervals if s < start + 40 and start < e and s < e)
+            self.assertEqual(sorted(tree.overlapping(start, start + 40)), expected)
+
+
+class LogWriterTestCase(unittest.TestCase):
+    """This class represents the queued log writer test case"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'error.log')
+        self.logger = logging.getLogger('fyyur-test-{}'.format(id(self)))
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def attach(self, writer):
+        handler = QueueHandler(writer.records)
+        handler.addFilter(RequestFilter())
+        self.logger.addHandler(handler)
+        writer.start()
+        return handler
+
+    def test_json_records_carry_request_id_and_latency(self):
+        writer = LogWriter(self.path, JSONFormatter(), flush_interval=0.05)
+        self.attach(writer)
+
+        with app.test_request_context('/venues'):
+            from flask import g
+            g.request_id = 'abc123'
+            g.request_started = 0
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                self.logger.exception('failed %s', 'badly')
+        writer.stop()
+
+        with open(self.path) as log:
+            record = json.loads(log.readline())
+        self.assertEqual(record['message'], 'failed badly')
+        self.assertEqual(record['request_id'], 'abc123')
+        self.assertEqual(record['path'], '/venues')
+        self.assertIn('latency_ms', record)
+        self.assertIn('ValueError: boom', record['exc'])
+
+    def test_rotates_by_size(self):
+        writer = LogWriter(self.path, logging.Formatter('%(message)s'), max_bytes=1000,
+                           backup_count=2, batch_size=10, flush_interval=0.01)
+        self.attach(writer)
+
+        for n in range(300):
+            self.logger.info('line %03d %s', n, 'x' * 40)
+        writer.stop()
+
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.assertTrue(os.path.exists(self.path + '.2'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+        for path in (self.path, self.path + '.1'):
+            self.assertLessEqual(os.path.getsize(path), 1000)
+        with open(self.path) as log:
+            self.assertTrue(log.read().rstrip().endswith('line 299 ' + 'x' * 40))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        writer = LogWriter(self.path, logging.Formatter('%(message)s'), queue_size=5)
+        handler = QueueHandler(writer.records)
+        self.logger.addHandler(handler)
+
+        for n in range(8):
+            self.logger.info('line %d', n)
+
+        self.assertEqual(handler.dropped, 3)
+        writer.start()
+        writer.stop()
+        with open(self.path) as log:
+            self.assertEqual(len(log.readlines()), 5)
+
+
+class MemcachedHandler(socketserver.StreamRequestHandler):
+    """The handful of memcached text protocol commands MemcachedCache sends"""
+
+    def handle(self):
+        items = self.server.items
+        for line in self.rfile:
+            command, *args = line.decode().split()
+            if command == 'get':
+                if args[0] in items:
+                    value = items[args[0]]
+                    self.wfile.write('VALUE {} 0 {}\r\n'.format(args[0], len(value)).encode() + value + b'\r\n')
+                self.wfile.write(b'END\r\n')
+            elif command in ('set', 'add'):
+                value = self.rfile.read(int(args[3]) + 2)[:-2]
+                if command == 'add' and args[0] in items:
+                    self.wfile.write(b'NOT_STORED\r\n')
+                else:
+                    items[args[0]] = value
+                    self.wfile.write(b'STORED\r\n')
+            elif command == 'delete':
+                self.wfile.write(b'DELETED\r\n' if items.pop(args[0], None) is not None else b'NOT_FOUND\r\n')
+            elif command == 'incr':
+                if args[0] in items:
+                    items[args[0]] = str(int(items[args[0]]) + int(args[1])).encode()
+                    self.wfile.write(items[args[0]] + b'\r\n')
+                else:
+                    self.wfile.write(b'NOT_FOUND\r\n')
+            else:
+                self.server.unknown.append(command)
+                self.wfile.write(b'ERROR\r\n')
+            self.wfile.flush()
+
+
+class MemcachedCacheTestCase(unittest.TestCase):
+    """This class represents the memcached page cache test case"""
+
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), MemcachedHandler)
+        self.server.daemon_threads = True
+        self.server.items = {'other:key': b'kept'}
+        self.server.unknown = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.backend = MemcachedCache(*self.server.server_address)
+
+    def tearDown(self):
+        self.backend.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_clear_only_drops_own_keys(self):
+        other = MemcachedCache(*self.server.server_address, generation_ttl=0)
+        self.backend.set('venues', '<html>', 60)
+        self.assertEqual(other.get('venues'), '<html>')
+
+        self.backend.clear()
+        self.assertIsNone(self.backend.get('venues'))
+        self.assertIsNone(other.get('venues'))
+        self.backend.clear()
+        self.backend.set('venues', '<html>', 60)
+        self.assertEqual(other.get('venues'), '<html>')
+        other.close()
+
+        self.assertEqual(self.server.items['other:key'], b'kept')
+        self.assertEqual(self.server.items['fyyur:generation'], b'2')
+        self.assertEqual(self.server.unknown, [])
+
+    def test_clear_keeps_hit_counts(self):
+        cache = ResponseCache(self.backend)
+        view = cache.cached('venues')(lambda: '<html>')
+        with app.test_request_context('/venues'):
+            view()
+            view()
+            cache.clear()
+            view()
+
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 2))
+
+
+@unittest.skipUnless(app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql')
+                     and os.environ.get('FYYUR_EXPLAIN_TESTS'),
+                     'needs Postgres and FYYUR_EXPLAIN_TESTS=1, seeds 1M shows')
+class ShowsIndexTestCase(unittest.TestCase):
+    """Checks the planner uses the shows composite indexes at 1M shows"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.context = app.app_context()
+        cls.context.push()
+        db.create_all()
+        seed.seed(venues=10000, artists=10000, shows=1000000)
+        db.session.execute('ANALYZE shows')
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.context.pop()
+
+    def explain(self, column):
+        query = 'EXPLAIN SELECT count(*) FROM shows WHERE {} = :id AND start_time > :now'.format(column)
+        rows = db.session.execute(query, {'id': 1, 'now': datetime.now()})
+        return '\n'.join(row[0] for row in rows)
+
+    def test_venue_shows_use_index(self):
+        self.assertIn('ix_shows_venue_id_start_time', self.explain('venue_id'))
+
+    def test_artist_shows_use_index(self):
+        self.assertIn('ix_shows_artist_id_start_time', self.explain('artist_id'))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+'''
+Times the category queries with questions.category as unindexed text
+(before migrations/002_question_category_fk.sql) and as an integer
+foreign key indexed on (category, id) (after).
+
+    python benchmarks/category.py --questions 200000
+    python benchmarks/category.py --database postgresql://localhost:5432/trivia_bench
+
+Both layouts are built as scratch tables in the given database (a
+temporary SQLite file by default) from the same seeded data and dropped
+afterwards. The queries are the ones the API runs: a page of a category,
+the next page by cursor, the per-category counts and a category's quiz
+deck.
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, String, Table, create_engine, func, select
+
+metadata = MetaData()
+
+categories = Table('bench_categories', metadata,
+  Column('id', Integer, primary_key=True),
+  Column('type', String))
+
+before = Table('bench_questions_before', metadata,
+  Column('id', Integer, primary_key=True),
+  Column('question', String),
+  Column('category', String))
+
+after = Table('bench_questions_after', metadata,
+  Column('id', Integer, primary_key=True),
+  Column('question', String),
+  Column('category', Integer, ForeignKey('bench_categories.id')),
+  Index('ix_bench_questions_after_category', 'category', 'id'))
+
+
+def fill(engine, questions, category_count, seed, batch_size=10000):
+  rng = random.Random(seed)
+  with engine.begin() as conn:
+    conn.execute(categories.insert(), [{'id': id, 'type': 'category {}'.format(id)}
+                                       for id in range(1, category_count + 1)])
+  for start in range(1, questions + 1, batch_size):
+    rows = [{'id': id, 'question': 'question {}?'.format(id), 'category': rng.randrange(1, category_count + 1)}
+            for id in range(start, min(start + batch_size, questions + 1))]
+    with engine.begin() as conn:
+      conn.execute(after.insert(), rows)
+      conn.execute(before.insert(), [dict(row, category=str(row['category'])) for row in rows])
+
+
+def queries(table, category):
+  value = category if table is after else str(category)
+  in_category = table.c.category == value
+  return {
+    'category page': select([table]).where(in_category).order_by(table.c.id).limit(11),
+    'next page (cursor)': select([table]).where(in_category).where(table.c.id > 1000)
+      .order_by(table.c.id).limit(11),
+    'counts per category': select([table.c.category, func.count(table.c.id)]).group_by(table.c.category),
+    'quiz deck': select([table.c.id]).where(in_category),
+  }
+
+
+def timed(engine, statement, repeat):
+  with engine.connect() as conn:
+    conn.execute(statement).fetchall()
+    started = time.perf_counter()
+    for _ in range(repeat):
+      conn.execute(statement).fetchall()
+  return (time.perf_counter() - started) / repeat
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark category queries before and after the foreign key.')
+  parser.add_argument('--database', help='SQLAlchemy url, a temporary SQLite file by default')
+  parser.add_argument('--questions', type=int, default=200000)
+  parser.add_argument('--categories', type=int, default=6)
+  parser.add_argument('--repeat', type=int, default=20)
+  parser.add_argument('--seed', type=int, default=1)
+  args = parser.parse_args()
+
+  directory = tempfile.TemporaryDirectory()
+  engine = create_engine(args.database or 'sqlite:///' + os.path.join(directory.name, 'bench.db'))
+  metadata.drop_all(engine)
+  metadata.create_all(engine)
+  try:
+    fill(engine, args.questions, args.categories, args.seed)
+    if engine.dialect.name == 'postgresql':
+      with engine.begin() as conn:
+        conn.execute('ANALYZE bench_questions_before')
+        conn.execute('ANALYZE bench_questions_after')
+
+    print('{:,} questions, {} categories ({})'.format(args.questions, args.categories, engine.dialect.name))
+    print('{:22} {:>12} {:>12}'.format('query', 'before ms', 'after ms'))
+    slow = queries(before, 1)
+    fast = queries(after, 1)
+    for name in slow:
+      print('{:22} {:12.3f} {:12.3f}'.format(name, timed(engine, slow[name], args.repeat) * 1000,
+                                             timed(engine, fast[name], args.repeat) * 1000))
+  finally:
+    metadata.drop_all(engine)
+    directory.cleanup()
@@ -0,0 +1,72 @@
+'''
+Times quiz question draws over a large synthetic question set.
+
+    python benchmarks/quiz.py --questions 1000000
+
+Compares the QuizEngine with the straightforward approach of filtering
+every question of the category against previous_questions. Both run on
+the same ids, category split and random seed, so runs are repeatable.
+No database is needed.
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from quiz import QuizEngine
+
+
+def naive_draw(questions, category, previous):
+  candidates = [id for id, question_category in questions
+                if (category is None or question_category == category) and id not in previous]
+  return random.choice(candidates) if candidates else None
+
+
+def play(draw, quizzes, length, categories):
+  started = time.perf_counter()
+  draws = 0
+  for _ in range(quizzes):
+    category = random.choice(categories)
+    previous = set()
+    for _ in range(length):
+      id = draw(category, previous)
+      draws += 1
+      if id is None:
+        break
+      previous.add(id)
+  return (time.perf_counter() - started) / draws
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark quiz question draws.')
+  parser.add_argument('--questions', type=int, default=1000000)
+  parser.add_argument('--categories', type=int, default=6)
+  parser.add_argument('--quizzes', type=int, default=1000)
+  parser.add_argument('--length', type=int, default=20)
+  parser.add_argument('--naive-quizzes', type=int, default=5,
+                      help='the naive version scans every question, keep this small')
+  parser.add_argument('--seed', type=int, default=1)
+  args = parser.parse_args()
+
+  random.seed(args.seed)
+  questions = [(id, random.randrange(1, args.categories + 1)) for id in range(1, args.questions + 1)]
+  categories = [None] + list(range(1, args.categories + 1))
+
+  engine = QuizEngine()
+  started = time.perf_counter()
+  engine.load(questions)
+  load = time.perf_counter() - started
+
+  random.seed(args.seed)
+  fast = play(engine.draw, args.quizzes, args.length, categories)
+  random.seed(args.seed)
+  naive = play(lambda category, previous: naive_draw(questions, category, previous),
+               args.naive_quizzes, args.length, categories)
+
+  print('{:,} questions, {} categories, {}-question quizzes'.format(args.questions, args.categories, args.length))
+  print('engine load   {:10.1f} ms'.format(load * 1000))
+  print('engine draw   {:10.4f} ms/question'.format(fast * 1000))
+  print('naive draw    {:10.4f} ms/question'.format(naive * 1000))
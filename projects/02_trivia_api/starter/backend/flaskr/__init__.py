@@ -4,42 +4,73 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category
+from models import setup_db, Question, Category, catalog
+from quiz import quiz_engine
+from search import question_search
 
 QUESTIONS_PER_PAGE = 10
 
+def paginate_questions(query):
+  '''
+  one page of query's questions, cut in SQL. ?after=<id> seeks past the
+  last question of the previous page on the id (or category, id) index,
+  ?page=<n> serves the numbered page links with an OFFSET.
+  returns the formatted questions and the cursor of the next page or None
+  '''
+  after = request.args.get('after', None, type=int)
+  page = request.args.get('page', 1, type=int)
+  if ('after' in request.args and after is None) or page < 1:
+    abort(400)
+
+  query = query.order_by(Question.id)
+  if after is not None:
+    query = query.filter(Question.id > after)
+  else:
+    query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
+  rows = query.limit(QUESTIONS_PER_PAGE + 1).all()
+
+  if not rows and (after is not None or page > 1):
+    abort(404)
+  next_cursor = rows[QUESTIONS_PER_PAGE - 1].id if len(rows) > QUESTIONS_PER_PAGE else None
+  return [question.format() for question in rows[:QUESTIONS_PER_PAGE]], next_cursor
+
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
   setup_db(app)
-  
-  '''
-  @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
-  '''
+  CORS(app, resources={r"/*": {"origins": "*"}})
 
-  '''
-  @TODO: Use the after_request decorator to set Access-Control-Allow
-  '''
-
-  '''
-  @TODO: 
-  Create an endpoint to handle GET requests 
-  for all available categories.
-  '''
+  @app.after_request
+  def after_request(response):
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PATCH,DELETE,OPTIONS')
+    return response
 
+  @app.route('/categories')
+  def get_categories():
+    return jsonify({
+      'success': True,
+      'categories': catalog.categories()
+    })
 
   '''
-  @TODO: 
-  Create an endpoint to handle GET requests for questions, 
-  including pagination (every 10 questions). 
-  This endpoint should return a list of questions, 
-  number of total questions, current category, categories. 
-
-  TEST: At this point, when you start the application
-  you should see questions and categories generated,
-  ten questions per page and pagination at the bottom of the screen for three pages.
-  Clicking on the page numbers should update the questions. 
+  GET /questions?page=<n> or ?after=<id>
+    ten questions per page, ordered by id. the count and categories come
+    from the catalog cache, so turning a page is a single LIMIT query
   '''
+  @app.route('/questions')
+  def get_questions():
+    questions, next_cursor = paginate_questions(Question.query)
+    categories, total_questions = catalog.get()
+
+    return jsonify({
+      'success': True,
+      'questions': questions,
+      'total_questions': total_questions,
+      'categories': categories,
+      'current_category': None,
+      'next_cursor': next_cursor
+    })
 
   '''
   @TODO: 
@@ -70,6 +101,30 @@ def create_app(test_config=None):
   only question that include that string within their question. 
   Try using the word "title" to start. 
   '''
+  @app.route('/questions/search', methods=['POST'])
+  def search_questions():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('searchTerm'), str):
+      abort(400)
+    try:
+      page = int(body.get('page', request.args.get('page', 1)))
+    except (TypeError, ValueError):
+      abort(400)
+    if page < 1:
+      abort(400)
+
+    term = body['searchTerm'].strip()
+    questions, total = question_search.search(term, (page - 1) * QUESTIONS_PER_PAGE, QUESTIONS_PER_PAGE)
+    if not questions and page > 1:
+      abort(404)
+
+    return jsonify({
+      'success': True,
+      'questions': [question.format() for question in questions],
+      'total_questions': total,
+      'current_category': None
+    })
+
 
   '''
   @TODO: 
@@ -79,6 +134,20 @@ def create_app(test_config=None):
   categories in the left column will cause only questions of that 
   category to be shown. 
   '''
+  @app.route('/categories/<int:category_id>/questions')
+  def get_category_questions(category_id):
+    categories = catalog.categories()
+    if str(category_id) not in categories:
+      abort(404)
+    questions, next_cursor = paginate_questions(Question.query.filter(Question.category == category_id))
+
+    return jsonify({
+      'success': True,
+      'questions': questions,
+      'total_questions': catalog.category_questions(category_id),
+      'current_category': categories[str(category_id)],
+      'next_cursor': next_cursor
+    })
 
 
   '''
@@ -92,13 +161,63 @@ def create_app(test_config=None):
   one question at a time is displayed, the user is allowed to answer
   and shown whether they were correct or not. 
   '''
+  @app.route('/quizzes', methods=['POST'])
+  def play_quiz():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+      abort(400)
+    previous_questions = body.get('previous_questions') or []
+    quiz_category = body.get('quiz_category') or {}
+    try:
+      previous_questions = set(int(id) for id in previous_questions)
+      category = int(quiz_category.get('id', 0))
+    except (TypeError, ValueError, AttributeError):
+      abort(400)
+
+    # the engine only hands out ids, a question deleted by another
+    # process is dropped from it and the draw repeated
+    while True:
+      id = quiz_engine.draw(category or None, previous_questions)
+      question = Question.query.get(id) if id is not None else None
+      if id is None or question is not None:
+        break
+      quiz_engine.remove(id)
+
+    return jsonify({
+      'success': True,
+      'question': question.format() if question else None
+    })
+
 
   '''
   @TODO: 
   Create error handlers for all expected errors 
   including 404 and 422. 
   '''
-  
+  @app.errorhandler(400)
+  def bad_request(error):
+    return jsonify({
+      'success': False,
+      'error': 400,
+      'message': 'bad request'
+    }), 400
+
+  @app.errorhandler(404)
+  def not_found(error):
+    return jsonify({
+      'success': False,
+      'error': 404,
+      'message': 'resource not found'
+    }), 404
+
+  @app.errorhandler(422)
+  def unprocessable(error):
+    return jsonify({
+      'success': False,
+      'error': 422,
+      'message': 'unprocessable'
+    }), 422
+
   return app
 
     
\ No newline at end of file
@@ -0,0 +1,230 @@
+'''
+Bulk loads categories and questions into the trivia database.
+
+    python loader.py dump trivia.psql
+    python loader.py synthetic --questions 1000000 --distribution 1=4,2=1,3=2
+
+`dump` reads the COPY sections of a pg_dump file such as trivia.psql
+without running the rest of it, so it also works on other databases.
+`synthetic` makes up questions spread over the existing categories with
+the given weights (all equal by default) and a fixed random seed.
+
+Rows are streamed, never held in memory all at once. On Postgres they go
+through COPY FROM STDIN, elsewhere through executemany inserts of
+--batch-size rows. DATABASE_URL (or --database) picks the database, the
+tables are created if needed and nothing is cleared beforehand.
+'''
+import argparse
+import io
+import itertools
+import os
+import random
+import re
+import time
+
+from sqlalchemy import create_engine
+
+from models import database_path, db, Question, Category
+
+BATCH_SIZE = 10000
+DUMP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+COPY_HEADER = re.compile(r'^COPY (?:\w+\.)?(\w+) \(([^)]*)\) FROM stdin;$')
+COPY_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v', '\\': '\\'}
+
+TABLES = {'categories': Category.__table__, 'questions': Question.__table__}
+
+WORDS = ['river', 'planet', 'painter', 'empire', 'treaty', 'volcano', 'novel', 'symphony',
+         'island', 'element', 'battle', 'festival', 'mountain', 'athlete', 'inventor', 'comet']
+TEMPLATES = ['Which {} is number {}?', 'What is the name of {} {}?', 'Who first described {} {}?',
+             'Where is {} {} found?', 'When was {} {} first recorded?']
+
+
+def copy_unescape(value):
+  if value == '\\N':
+    return None
+  if '\\' not in value:
+    return value
+  return re.sub(r'\\(.)', lambda match: COPY_ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def copy_escape(value):
+  if value is None:
+    return '\\N'
+  return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def read_dump(lines):
+  '''
+  read_dump(lines)
+    yields (table, columns, rows) for every COPY section of a pg_dump in
+    text format, rows is an iterator of tuples that must be consumed
+    before the next section
+  '''
+  lines = iter(lines)
+  for line in lines:
+    match = COPY_HEADER.match(line.rstrip('\n'))
+    if match:
+      columns = [column.strip().strip('"') for column in match.group(2).split(',')]
+      rows = (tuple(copy_unescape(value) for value in row.rstrip('\n').split('\t'))
+              for row in itertools.takewhile(lambda row: row.rstrip('\n') != '\\.', lines))
+      yield match.group(1), columns, rows
+
+
+def synthetic_questions(count, distribution, start_id=1, seed=1):
+  '''
+  synthetic_questions(count, distribution)
+    count made up question rows, distribution maps category ids to weights
+  '''
+  rng = random.Random(seed)
+  categories = list(distribution)
+  weights = list(itertools.accumulate(distribution[category] for category in categories))
+  for id in range(start_id, start_id + count):
+    topic = rng.choice(WORDS)
+    yield (id,
+           rng.choice(TEMPLATES).format(topic, id),
+           '{} {}'.format(rng.choice(WORDS), topic),
+           rng.randint(1, 5),
+           rng.choices(categories, cum_weights=weights)[0])
+
+
+def parse_distribution(text, categories):
+  if not text:
+    return {category: 1 for category in categories}
+  distribution = {}
+  for part in text.split(','):
+    category, _, weight = part.partition('=')
+    distribution[int(category)] = float(weight or 1)
+  unknown = set(distribution) - set(categories)
+  if unknown:
+    raise ValueError('unknown categories {}'.format(sorted(unknown)))
+  return distribution
+
+
+class CopyStream(io.TextIOBase):
+  '''
+  CopyStream(rows)
+    a file-like view of rows in COPY text format for copy_expert
+  '''
+  def __init__(self, rows):
+    self.lines = ('\t'.join(copy_escape(value) for value in row) + '\n' for row in rows)
+    self.buffer = ''
+
+  def readable(self):
+    return True
+
+  def read(self, size=-1):
+    while size < 0 or len(self.buffer) < size:
+      line = next(self.lines, None)
+      if line is None:
+        break
+      self.buffer += line
+    if size < 0:
+      size = len(self.buffer)
+    chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+    return chunk
+
+
+def load_rows(engine, table, columns, rows, batch_size=BATCH_SIZE):
+  '''
+  load_rows(engine, table, columns, rows)
+    streams rows (tuples in columns order) into table, returns the count
+  '''
+  counted = CountedRows(rows)
+  if engine.dialect.name == 'postgresql':
+    connection = engine.raw_connection()
+    try:
+      cursor = connection.cursor()
+      cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(table.name, ', '.join(columns)), CopyStream(counted))
+      if 'id' in columns:
+        # rows came with their ids, move the sequence past them
+        cursor.execute("SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                       "coalesce(max(id), 1), max(id) IS NOT NULL) FROM {0}".format(table.name))
+      connection.commit()
+    finally:
+      connection.close()
+    return counted.count
+
+  insert = table.insert()
+  while True:
+    batch = [dict(zip(columns, row)) for row in itertools.islice(counted, batch_size)]
+    if not batch:
+      return counted.count
+    with engine.begin() as connection:
+      connection.execute(insert, batch)
+
+
+class CountedRows:
+  def __init__(self, rows):
+    self.rows = iter(rows)
+    self.count = 0
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    row = next(self.rows)
+    self.count += 1
+    return row
+
+
+def load_dump(engine, lines, batch_size=BATCH_SIZE):
+  '''
+  load_dump(engine, lines)
+    loads the categories and questions COPY sections of a dump,
+    returns {table name: rows loaded}
+  '''
+  loaded = {}
+  for name, columns, rows in read_dump(lines):
+    if name not in TABLES:
+      for _ in rows:
+        pass
+      continue
+    loaded[name] = load_rows(engine, TABLES[name], columns, rows, batch_size)
+  return loaded
+
+
+def load_synthetic(engine, count, distribution=None, seed=1, batch_size=BATCH_SIZE):
+  '''
+  load_synthetic(engine, count, distribution)
+    adds count generated questions after the highest existing id
+  '''
+  with engine.connect() as connection:
+    categories = [id for id, in connection.execute(Category.__table__.select().with_only_columns([Category.id]))]
+    start_id = (connection.execute(db.select([db.func.max(Question.id)])).scalar() or 0) + 1
+  if not categories:
+    raise ValueError('load the categories first')
+  if not isinstance(distribution, dict):
+    distribution = parse_distribution(distribution, categories)
+
+  rows = synthetic_questions(count, distribution, start_id, seed)
+  columns = ['id', 'question', 'answer', 'difficulty', 'category']
+  return load_rows(engine, Question.__table__, columns, rows, batch_size)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Bulk load trivia categories and questions.')
+  parser.add_argument('--database', default=database_path)
+  parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+  commands = parser.add_subparsers(dest='command')
+  dump = commands.add_parser('dump', help='load the COPY data of a pg_dump file')
+  dump.add_argument('path', nargs='?', default=DUMP_PATH)
+  synthetic = commands.add_parser('synthetic', help='generate questions')
+  synthetic.add_argument('--questions', type=int, default=1000000)
+  synthetic.add_argument('--distribution', help='category=weight pairs, e.g. 1=4,2=1 (default: even)')
+  synthetic.add_argument('--seed', type=int, default=1)
+  args = parser.parse_args()
+
+  engine = create_engine(args.database)
+  db.Model.metadata.create_all(engine)
+  started = time.perf_counter()
+  if args.command == 'synthetic':
+    loaded = {'questions': load_synthetic(engine, args.questions, args.distribution, args.seed, args.batch_size)}
+  else:
+    with open(getattr(args, 'path', DUMP_PATH), encoding='utf-8') as lines:
+      loaded = load_dump(engine, lines, args.batch_size)
+  elapsed = time.perf_counter() - started
+
+  for name, count in loaded.items():
+    print('{:12} {:>10,} rows'.format(name, count))
+  print('{:.1f} s'.format(elapsed))
@@ -0,0 +1,18 @@
+--
+-- Trigram index behind POST /questions/search.
+--
+-- Serves the ILIKE '%term%' filter and word_similarity ranking in
+-- search.py. Run it against an existing database with
+--
+--     psql trivia < migrations/001_question_search.sql
+--
+-- CONCURRENTLY builds the index without blocking writes to questions,
+-- so the file must not be wrapped in a transaction. To revert:
+--
+--     DROP INDEX CONCURRENTLY IF EXISTS public.ix_questions_question_trgm;
+--
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_question_trgm
+    ON public.questions USING gin (question gin_trgm_ops);
@@ -0,0 +1,83 @@
+--
+-- Turns questions.category from free text into an integer foreign key
+-- to categories.id, indexed on (category, id) for the category pages,
+-- the quiz and the per-category counts.
+--
+--     psql trivia < migrations/002_question_category_fk.sql
+--
+-- Needs PostgreSQL 11 or later and must not be wrapped in a transaction:
+-- the backfill commits every batch and the index is built CONCURRENTLY,
+-- so the table stays writable until the final swap, which only changes
+-- the catalog. Values that are a category id or a category name are
+-- kept, anything else becomes NULL. A database restored from trivia.psql
+-- already has an integer column with a "category" foreign key, it goes
+-- through the same steps and ends up with the same constraint and index.
+-- To revert, add a text column back with category::text and swap the
+-- columns the same way.
+--
+
+CREATE OR REPLACE FUNCTION public.question_category_id(category text) RETURNS integer
+    LANGUAGE sql STABLE AS $$
+    SELECT c.id FROM public.categories c
+    WHERE c.id::text = trim(category) OR lower(c.type) = lower(trim(category))
+    ORDER BY c.id LIMIT 1
+$$;
+
+ALTER TABLE public.questions ADD COLUMN IF NOT EXISTS category_id integer;
+
+-- rows written while the migration runs are converted as they arrive
+CREATE OR REPLACE FUNCTION public.questions_sync_category_id() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.category_id := public.question_category_id(NEW.category::text);
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS questions_sync_category_id ON public.questions;
+CREATE TRIGGER questions_sync_category_id BEFORE INSERT OR UPDATE OF category ON public.questions
+    FOR EACH ROW EXECUTE PROCEDURE public.questions_sync_category_id();
+
+-- backfill 5000 rows per transaction, walking the primary key
+DO $$
+DECLARE
+    last_id integer := 0;
+    batch_end integer;
+BEGIN
+    LOOP
+        SELECT max(id) INTO batch_end FROM (
+            SELECT id FROM public.questions WHERE id > last_id ORDER BY id LIMIT 5000
+        ) batch;
+        EXIT WHEN batch_end IS NULL;
+
+        UPDATE public.questions SET category_id = public.question_category_id(category::text)
+        WHERE id > last_id AND id <= batch_end AND category_id IS NULL;
+
+        last_id := batch_end;
+        COMMIT;
+    END LOOP;
+END
+$$;
+
+-- NOT VALID + VALIDATE checks the existing rows without blocking writes.
+-- the actions are the ones trivia.psql gives its "category" constraint
+ALTER TABLE public.questions DROP CONSTRAINT IF EXISTS questions_category_fkey;
+ALTER TABLE public.questions ADD CONSTRAINT questions_category_fkey
+    FOREIGN KEY (category_id) REFERENCES public.categories (id)
+    ON UPDATE CASCADE ON DELETE SET NULL NOT VALID;
+ALTER TABLE public.questions VALIDATE CONSTRAINT questions_category_fkey;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_category
+    ON public.questions USING btree (category_id, id);
+
+-- the swap needs a brief exclusive lock, give up rather than queue
+-- behind a long running query
+BEGIN;
+SET LOCAL lock_timeout = '5s';
+DROP TRIGGER questions_sync_category_id ON public.questions;
+ALTER TABLE public.questions DROP COLUMN category;
+ALTER TABLE public.questions RENAME COLUMN category_id TO category;
+COMMIT;
+
+DROP FUNCTION public.questions_sync_category_id();
+DROP FUNCTION public.question_category_id(text);
@@ -1,10 +1,13 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+import threading
+import time
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, create_engine, event, func
+from sqlalchemy.orm import Session
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get('DATABASE_URL', "postgres://{}/{}".format('localhost:5432', database_name))
 
 db = SQLAlchemy()
 
@@ -19,6 +22,23 @@ def setup_db(app, database_path=database_path):
     db.init_app(app)
     db.create_all()
 
+'''
+on_commit(session, fn, *args)
+    calls fn(*args) once session's current transaction commits.
+    a rollback drops the call
+'''
+def on_commit(session, fn, *args):
+    session.info.setdefault('on_commit', []).append((fn, args))
+
+@event.listens_for(Session, 'after_commit')
+def run_on_commit(session):
+    for fn, args in session.info.pop('on_commit', []):
+        fn(*args)
+
+@event.listens_for(Session, 'after_rollback')
+def drop_on_commit(session):
+    session.info.pop('on_commit', None)
+
 '''
 Question
 
@@ -29,18 +49,23 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='SET NULL'))
   difficulty = Column(Integer)
 
+  # category pages and quiz decks walk (category, id) in index order,
+  # see migrations/002_question_category_fk.sql
+  __table_args__ = (Index('ix_questions_category', 'category', 'id'),)
+
   def __init__(self, question, answer, category, difficulty):
     self.question = question
     self.answer = answer
-    self.category = category
+    self.category = int(category) if category is not None else None
     self.difficulty = difficulty
 
   def insert(self):
     db.session.add(self)
     db.session.commit()
+    catalog.invalidate()
   
   def update(self):
     db.session.commit()
@@ -48,6 +73,7 @@ class Question(db.Model):
   def delete(self):
     db.session.delete(self)
     db.session.commit()
+    catalog.invalidate()
 
   def format(self):
     return {
@@ -75,4 +101,47 @@ class Category(db.Model):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+Catalog
+    the category map and question counts shown next to every page of
+    questions. read once and kept until a question is inserted or deleted,
+    or for at most ttl seconds so other processes' writes show up too.
+    the counts come from one GROUP BY over the category index
+'''
+class Catalog:
+  def __init__(self, ttl=60):
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.entry = None
+
+  def load(self):
+    # callers keep the entry they got, invalidate() may clear self.entry meanwhile
+    entry = self.entry
+    if entry is None or entry[2] < time.monotonic():
+      with self.lock:
+        entry = self.entry
+        if entry is None or entry[2] < time.monotonic():
+          categories = {str(id): type for id, type in db.session.query(Category.id, Category.type).order_by(Category.id)}
+          counts = dict(db.session.query(Question.category, func.count(Question.id)).group_by(Question.category))
+          entry = self.entry = (categories, counts, time.monotonic() + self.ttl)
+    return entry
+
+  def get(self):
+    entry = self.load()
+    return entry[0], sum(entry[1].values())
+
+  def categories(self):
+    return self.get()[0]
+
+  def total_questions(self):
+    return self.get()[1]
+
+  def category_questions(self, category):
+    return self.load()[1].get(category, 0)
+
+  def invalidate(self):
+    self.entry = None
+
+catalog = Catalog()
@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+from array import array
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from models import Question, on_commit
+
+'''
+QuizEngine
+  draws random question ids for the quiz without touching the database.
+  ids are kept in one array per category plus one for all questions and
+  a draw picks random slots until it finds an id the player has not seen
+  (rejection sampling), so it costs the same whether the table holds a
+  hundred questions or millions. once a quiz has used up most of a
+  category the few ids left are picked from an exact scan instead
+
+  the arrays are loaded on first use with a single (id, category) query,
+  an index-only scan of ix_questions_category, and kept in step with
+  committed inserts and deletes. deleted ids are skipped on draw and
+  swept out when they pile up. like the Catalog the arrays are read again
+  after ttl seconds, so questions other processes or loader.py wrote show up
+'''
+class QuizEngine:
+  def __init__(self, max_tries=32, sweep_ratio=0.25, ttl=60):
+    self.max_tries = max_tries
+    self.sweep_ratio = sweep_ratio
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.load_lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.decks = None
+    self.removed = set()
+    self.expires_at = 0
+
+  def load(self, rows=None):
+    '''
+    load(rows)
+      rows are (id, category) pairs, by default every question in the table
+    '''
+    if rows is None:
+      rows = Question.query.with_entities(Question.id, Question.category) \
+        .order_by(Question.category, Question.id).yield_per(10000)
+    decks = {None: array('q')}
+    for id, category in rows:
+      self.append(decks, id, category)
+    with self.lock:
+      self.decks = decks
+      self.removed = set()
+      self.expires_at = time.monotonic() + self.ttl
+    return decks
+
+  def deck(self, category):
+    decks = self.decks
+    if decks is None or self.expires_at < time.monotonic():
+      # while one request reloads stale decks the others draw from them
+      if self.load_lock.acquire(blocking=decks is None):
+        try:
+          decks = self.decks
+          if decks is None or self.expires_at < time.monotonic():
+            decks = self.load()
+        finally:
+          self.load_lock.release()
+    return decks.get(category, array('q'))
+
+  def append(self, decks, id, category):
+    decks[None].append(id)
+    if category is not None:
+      decks.setdefault(int(category), array('q')).append(id)
+
+  def draw(self, category=None, previous=()):
+    '''
+    draw(category, previous)
+      a random question id of category (None for any) that is not in
+      previous, or None when the player has seen them all
+    '''
+    deck = self.deck(category)
+    excluded = previous if isinstance(previous, (set, frozenset)) else set(previous)
+
+    with self.lock:
+      if not deck:
+        return None
+      removed = self.removed
+      for _ in range(self.max_tries):
+        id = deck[random.randrange(len(deck))]
+        if id not in excluded and id not in removed:
+          return id
+
+      left = [id for id in deck if id not in excluded and id not in removed]
+      return random.choice(left) if left else None
+
+  def add(self, id, category):
+    if self.decks is None:
+      return
+    with self.lock:
+      self.append(self.decks, id, category)
+
+  def remove(self, id):
+    if self.decks is None:
+      return
+    with self.lock:
+      self.removed.add(id)
+      if len(self.removed) > len(self.decks[None]) * self.sweep_ratio:
+        removed = self.removed
+        self.decks = {category: array('q', (id for id in deck if id not in removed))
+                      for category, deck in self.decks.items()}
+        self.removed = set()
+
+quiz_engine = QuizEngine()
+
+'''
+the engine follows committed inserts and deletes, a question moved to
+another category reloads it
+'''
+@event.listens_for(Question, 'after_insert')
+def question_inserted(mapper, connection, question):
+  on_commit(Session.object_session(question), quiz_engine.add, question.id, question.category)
+
+@event.listens_for(Question, 'after_delete')
+def question_deleted(mapper, connection, question):
+  on_commit(Session.object_session(question), quiz_engine.remove, question.id)
+
+@event.listens_for(Question, 'after_update')
+def question_updated(mapper, connection, question):
+  if get_history(question, 'category').deleted:
+    on_commit(Session.object_session(question), quiz_engine.reset)
@@ -0,0 +1,136 @@
+import threading
+
+from sqlalchemy import DDL, event, func, literal
+from sqlalchemy.orm import Session
+
+from models import db, Question, on_commit
+
+'''
+QuestionSearch
+  finds the questions whose text contains a search term, best matches
+  first: a match at the start of a word beats one inside a word, then
+  earlier and shorter questions win.
+
+  on Postgres the ILIKE filter is served by the trigram index from
+  migrations/001_question_search.sql and word_similarity orders the rows.
+  other databases (the tests, small deployments) use an in-memory
+  trigram inverted index that follows committed inserts and deletes
+'''
+class QuestionSearch:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.postings = None
+    self.texts = {}
+
+  def search(self, term, offset=0, limit=10):
+    '''
+    search(term, offset, limit)
+      one page of matching questions and the number of matches
+    '''
+    if db.engine.dialect.name == 'postgresql':
+      return self.search_postgres(term, offset, limit)
+
+    ids = self.match(term)
+    page = ids[offset:offset + limit]
+    questions = {question.id: question for question in Question.query.filter(Question.id.in_(page))} if page else {}
+    return [questions[id] for id in page if id in questions], len(ids)
+
+  def search_postgres(self, term, offset, limit):
+    pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    rows = db.session.query(Question, func.count().over()) \
+      .filter(Question.question.ilike(pattern)) \
+      .order_by(func.word_similarity(literal(term), Question.question).desc(),
+                func.length(Question.question), Question.id) \
+      .offset(offset).limit(limit).all()
+    total = rows[0][1] if rows else self.count_postgres(pattern) if offset else 0
+    return [question for question, _ in rows], total
+
+  def count_postgres(self, pattern):
+    # a page past the end has no row to carry the window count
+    return Question.query.filter(Question.question.ilike(pattern)).count()
+
+  def load(self):
+    postings = {}
+    texts = {}
+    for id, text in Question.query.with_entities(Question.id, Question.question).yield_per(10000):
+      self.index(postings, texts, id, text)
+    with self.lock:
+      self.postings = postings
+      self.texts = texts
+
+  def index(self, postings, texts, id, text):
+    text = (text or '').lower()
+    texts[id] = text
+    for gram in trigrams(text):
+      postings.setdefault(gram, set()).add(id)
+
+  def match(self, term):
+    term = term.lower()
+    if self.postings is None:
+      self.load()
+
+    with self.lock:
+      grams = trigrams(term)
+      if grams:
+        # the rarest trigram first keeps the intersection small
+        sets = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(sets[0]).intersection(*sets[1:])
+      else:
+        candidates = self.texts.keys()
+      matches = []
+      for id in candidates:
+        text = self.texts[id]
+        position = text.find(term)
+        if position != -1:
+          word_start = position == 0 or not text[position - 1].isalnum()
+          matches.append((not word_start, position, len(text), id))
+
+    matches.sort()
+    return [match[-1] for match in matches]
+
+  def add(self, id, text):
+    if self.postings is None:
+      return
+    with self.lock:
+      self.remove_locked(id)
+      self.index(self.postings, self.texts, id, text)
+
+  def remove(self, id):
+    if self.postings is None:
+      return
+    with self.lock:
+      self.remove_locked(id)
+
+  def remove_locked(self, id):
+    text = self.texts.pop(id, None)
+    if text is None:
+      return
+    for gram in trigrams(text):
+      ids = self.postings.get(gram)
+      if ids is not None:
+        ids.discard(id)
+        if not ids:
+          del self.postings[gram]
+
+def trigrams(text):
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+question_search = QuestionSearch()
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+def question_written(mapper, connection, question):
+  on_commit(Session.object_session(question), question_search.add, question.id, question.question)
+
+@event.listens_for(Question, 'after_delete')
+def question_deleted(mapper, connection, question):
+  on_commit(Session.object_session(question), question_search.remove, question.id)
+
+# tables made by create_all (e.g. the test database) get the index too,
+# existing databases run migrations/001_question_search.sql
+for statement in ('CREATE EXTENSION IF NOT EXISTS pg_trgm',
+                  'CREATE INDEX IF NOT EXISTS ix_questions_question_trgm ON questions USING gin (question gin_trgm_ops)'):
+  event.listen(Question.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
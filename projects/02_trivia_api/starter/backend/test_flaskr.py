@@ -2,9 +2,13 @@ import os
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, text
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import setup_db, Question, Category, catalog
+from quiz import QuizEngine, quiz_engine
+from search import question_search
+from loader import DUMP_PATH, load_dump, load_synthetic, read_dump
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -15,7 +19,7 @@ class TriviaTestCase(unittest.TestCase):
         self.app = create_app()
         self.client = self.app.test_client
         self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
+        self.database_path = os.environ.get('TEST_DATABASE_URL', "postgres://{}/{}".format('localhost:5432', self.database_name))
         setup_db(self.app, self.database_path)
 
         # binds the app to the current context
@@ -24,6 +28,13 @@ class TriviaTestCase(unittest.TestCase):
             self.db.init_app(self.app)
             # create all tables
             self.db.create_all()
+            # an empty test database gets the trivia.psql questions
+            if not Question.query.first():
+                with open(DUMP_PATH, encoding='utf-8') as dump:
+                    load_dump(self.db.engine, dump)
+        catalog.invalidate()
+        quiz_engine.reset()
+        question_search.reset()
     
     def tearDown(self):
         """Executed after reach test"""
@@ -34,6 +45,278 @@ class TriviaTestCase(unittest.TestCase):
     Write at least one test for each test for successful operation and for expected errors.
     """
 
+    def test_get_categories(self):
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertTrue(len(data['categories']))
+
+    def test_get_paginated_questions(self):
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertTrue(data['total_questions'])
+        self.assertTrue(len(data['categories']))
+        self.assertLessEqual(len(data['questions']), 10)
+
+    def test_questions_cursor_walks_every_question(self):
+        ids = []
+        url = '/questions'
+        while url:
+            data = json.loads(self.client().get(url).data)
+            ids += [question['id'] for question in data['questions']]
+            url = '/questions?after={}'.format(data['next_cursor']) if data['next_cursor'] else None
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), data['total_questions'])
+
+    def test_cursor_and_page_agree(self):
+        first = json.loads(self.client().get('/questions?page=1').data)
+        if first['next_cursor'] is None:
+            self.skipTest('needs more than one page of questions')
+        by_page = json.loads(self.client().get('/questions?page=2').data)
+        by_cursor = json.loads(self.client().get('/questions?after={}'.format(first['next_cursor'])).data)
+
+        self.assertEqual(by_page['questions'], by_cursor['questions'])
+
+    def test_get_category_questions(self):
+        categories = json.loads(self.client().get('/categories').data)['categories']
+        id = next(iter(categories))
+        res = self.client().get('/categories/{}/questions'.format(id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['current_category'], categories[id])
+        self.assertLessEqual(len(data['questions']), 10)
+        for question in data['questions']:
+            self.assertEqual(question['category'], int(id))
+
+    def test_category_questions_cursor_walks_the_category(self):
+        id = int(next(iter(json.loads(self.client().get('/categories').data)['categories'])))
+        ids = []
+        url = '/categories/{}/questions'.format(id)
+        while url:
+            data = json.loads(self.client().get(url).data)
+            ids += [question['id'] for question in data['questions']]
+            url = '/categories/{}/questions?after={}'.format(id, data['next_cursor']) if data['next_cursor'] else None
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), data['total_questions'])
+
+    def test_404_for_unknown_category(self):
+        res = self.client().get('/categories/100000/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_404_sent_requesting_beyond_valid_page(self):
+        res = self.client().get('/questions?page=1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'resource not found')
+
+    def test_400_sent_for_invalid_cursor(self):
+        res = self.client().get('/questions?after=abc')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_total_questions_follows_inserts_and_deletes(self):
+        total = json.loads(self.client().get('/questions').data)['total_questions']
+
+        with self.app.app_context():
+            question = Question(question='Test question?', answer='Test answer', category='1', difficulty=1)
+            question.insert()
+            self.assertEqual(json.loads(self.client().get('/questions').data)['total_questions'], total + 1)
+            question.delete()
+
+        self.assertEqual(json.loads(self.client().get('/questions').data)['total_questions'], total)
+
+    def test_quiz_never_repeats_a_question(self):
+        seen = []
+        while True:
+            res = self.client().post('/quizzes', json={'previous_questions': seen,
+                                                       'quiz_category': {'type': 'click', 'id': 0}})
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            if data['question'] is None:
+                break
+            self.assertNotIn(data['question']['id'], seen)
+            seen.append(data['question']['id'])
+
+        total = json.loads(self.client().get('/questions').data)['total_questions']
+        self.assertEqual(len(seen), total)
+
+    def test_quiz_stays_in_category(self):
+        categories = json.loads(self.client().get('/categories').data)['categories']
+        id = next(iter(categories))
+        res = self.client().post('/quizzes', json={'previous_questions': [],
+                                                   'quiz_category': {'type': categories[id], 'id': id}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        if data['question']:
+            self.assertEqual(data['question']['category'], int(id))
+
+    def test_quiz_sees_new_and_deleted_questions(self):
+        self.client().post('/quizzes', json={'previous_questions': []})
+
+        with self.app.app_context():
+            question = Question(question='Test question?', answer='Test answer', category='1', difficulty=1)
+            question.insert()
+            id = question.id
+            self.assertIn(id, quiz_engine.deck(1))
+            question.delete()
+
+        previous = [q for q in quiz_engine.deck(1) if q != id]
+        data = json.loads(self.client().post('/quizzes', json={'previous_questions': previous,
+                                                                'quiz_category': {'id': 1}}).data)
+        self.assertIsNone(data['question'])
+
+    def test_quiz_reloads_questions_written_elsewhere(self):
+        self.client().post('/quizzes', json={'previous_questions': []})
+
+        with self.app.app_context():
+            # written behind the engine's back, as another process or loader.py would
+            with self.db.engine.begin() as connection:
+                id = connection.execute(Question.__table__.insert().values(
+                    question='Elsewhere?', answer='Test answer', category=1, difficulty=1)).inserted_primary_key[0]
+            try:
+                self.assertNotIn(id, quiz_engine.deck(1))
+                quiz_engine.expires_at = 0
+                self.assertIn(id, quiz_engine.deck(1))
+            finally:
+                with self.db.engine.begin() as connection:
+                    connection.execute(Question.__table__.delete().where(Question.id == id))
+
+    def test_400_for_malformed_quiz_request(self):
+        res = self.client().post('/quizzes', json={'previous_questions': ['x']})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_quiz_engine_draws_exclude_previous(self):
+        engine = QuizEngine()
+        engine.load([(id, id % 3) for id in range(1, 1001)])
+
+        previous = set(range(1, 1000))
+        self.assertEqual(engine.draw(None, previous), 1000)
+        self.assertEqual(engine.draw(1, set(range(1, 1001, 3))), None)
+        engine.remove(1000)
+        self.assertIsNone(engine.draw(None, previous))
+
+    def test_search_questions(self):
+        res = self.client().post('/questions/search', json={'searchTerm': 'title'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertLessEqual(len(data['questions']), 10)
+        for question in data['questions']:
+            self.assertIn('title', question['question'].lower())
+
+    def test_search_ranks_word_matches_first(self):
+        with self.app.app_context():
+            inside = Question(question='Which subtitled film won?', answer='Test answer', category='1', difficulty=1)
+            word = Question(question='What title did the film win?', answer='Test answer', category='1', difficulty=1)
+            inside.insert()
+            word.insert()
+            ids = (inside.id, word.id)
+
+        try:
+            data = json.loads(self.client().post('/questions/search', json={'searchTerm': 'Title'}).data)
+            found = [question['id'] for question in data['questions'] if question['id'] in ids]
+            self.assertEqual(found, [ids[1], ids[0]][:len(found)])
+            self.assertGreaterEqual(data['total_questions'], 2)
+        finally:
+            with self.app.app_context():
+                for id in ids:
+                    Question.query.get(id).delete()
+
+        data = json.loads(self.client().post('/questions/search', json={'searchTerm': 'subtitled film'}).data)
+        self.assertEqual(data['total_questions'], 0)
+
+    def test_search_without_results(self):
+        res = self.client().post('/questions/search', json={'searchTerm': 'zxqvjk'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'], [])
+        self.assertEqual(data['total_questions'], 0)
+
+    def test_400_for_search_without_term(self):
+        res = self.client().post('/questions/search', json={})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+
+class LoaderTestCase(unittest.TestCase):
+    """This class represents the bulk loader test case"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Question.metadata.create_all(self.engine)
+
+    def count(self, table):
+        return self.engine.execute('SELECT count(*) FROM ' + table).scalar()
+
+    def test_read_dump(self):
+        with open(DUMP_PATH, encoding='utf-8') as dump:
+            sections = {name: (columns, list(rows)) for name, columns, rows in read_dump(dump)}
+
+        self.assertEqual(sections['categories'][0], ['id', 'type'])
+        self.assertIn(('1', 'Science'), sections['categories'][1])
+        self.assertEqual(sections['questions'][0], ['id', 'question', 'answer', 'difficulty', 'category'])
+        self.assertIn(('13', 'What is the largest lake in Africa?', 'Lake Victoria', '2', '3'), sections['questions'][1])
+
+    def test_read_dump_unescapes_copy_values(self):
+        dump = ['COPY public.questions (id, question, answer) FROM stdin;\n',
+                '1\tTab\\there\tline\\nbreak\n',
+                '2\t\\N\tback\\\\slash\n',
+                '\\.\n']
+        rows = [list(rows) for _, _, rows in read_dump(dump)][0]
+
+        self.assertEqual(rows, [('1', 'Tab\there', 'line\nbreak'), ('2', None, 'back\\slash')])
+
+    def test_load_dump_in_batches(self):
+        with open(DUMP_PATH, encoding='utf-8') as dump:
+            loaded = load_dump(self.engine, dump, batch_size=4)
+
+        self.assertEqual(loaded, {'categories': 6, 'questions': self.count('questions')})
+        self.assertEqual(self.count('categories'), 6)
+
+    def test_load_synthetic_follows_distribution(self):
+        with open(DUMP_PATH, encoding='utf-8') as dump:
+            load_dump(self.engine, dump)
+        before = self.count('questions')
+        last_id = self.engine.execute('SELECT max(id) FROM questions').scalar()
+
+        self.assertEqual(load_synthetic(self.engine, 6000, '1=5,2=1', batch_size=1000), 6000)
+        counts = dict(self.engine.execute(
+            text('SELECT category, count(*) FROM questions WHERE id > :last_id GROUP BY category'), last_id=last_id).fetchall())
+
+        self.assertEqual(self.count('questions'), before + 6000)
+        self.assertEqual(set(counts), {1, 2})
+        self.assertAlmostEqual(counts[1] / 6000, 5 / 6, delta=0.03)
+
+    def test_load_synthetic_rejects_unknown_categories(self):
+        with open(DUMP_PATH, encoding='utf-8') as dump:
+            load_dump(self.engine, dump)
+
+        with self.assertRaises(ValueError):
+            load_synthetic(self.engine, 10, '99=1')
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
@@ -0,0 +1,79 @@
+'''
+Times GET /drinks-detail with the verified-token cache on and off.
+
+    python benchmark.py
+
+Tokens are signed with a throwaway key served from a local JWKS
+endpoint, so no Auth0 tenant is needed.
+'''
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Crypto.PublicKey import RSA
+from jose import jwk, jwt
+
+
+class JWKSHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(self.server.jwks).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_jwks_server(public_key):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), JWKSHandler)
+    server.jwks = {'keys': [public_key]}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(client, headers, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        res = client.get('/drinks-detail', headers=headers)
+        assert res.status_code == 200, res.data
+    return (time.perf_counter() - started) / repeat
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark requires_auth.')
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    key = jwk.construct(RSA.generate(2048).export_key(), 'RS256')
+    public_key = key.public_key().to_dict()
+    public_key.update({'kid': 'bench', 'use': 'sig'})
+    server = start_jwks_server(public_key)
+    os.environ['JWKS_URL'] = 'http://127.0.0.1:{}/.well-known/jwks.json'.format(server.server_address[1])
+
+    from src.api import app
+    from src.auth import auth
+
+    token = jwt.encode({
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'exp': int(time.time()) + 3600,
+        'permissions': ['get:drinks-detail']
+    }, key.to_pem(), algorithm='RS256', headers={'kid': 'bench'})
+    headers = {'Authorization': 'Bearer ' + token}
+    client = app.test_client()
+
+    size = auth.token_cache.size
+    auth.token_cache.size = 0
+    off = timed(client, headers, args.repeat)
+    auth.token_cache.size = size
+    on = timed(client, headers, args.repeat)
+
+    print('cache off {:8.3f} ms/request'.format(off * 1000))
+    print('cache on  {:8.3f} ms/request'.format(on * 1000))
+    server.shutdown()
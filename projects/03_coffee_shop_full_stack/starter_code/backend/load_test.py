@@ -0,0 +1,119 @@
+'''
+Measures drink list reads per second while other threads keep writing.
+
+    python load_test.py
+
+Each configuration runs in its own process against a scratch database
+(the engine is set up when src.api is imported), so database.db is never
+touched. "default" is SQLite's rollback journal with a fresh connection
+per checkout and reads on the shared pool, "tuned" the WAL, pooled and
+read-only settings that setup_db uses now. Every read runs in a thread
+of its own, as under a threaded server, so the readers use far more
+threads than the pools hold connections.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CONFIGS = {
+    'default': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL',
+                'SQLITE_BUSY_TIMEOUT': '5000', 'DB_READ_ONLY': '0', 'DB_POOL_SIZE': '0'},
+    'tuned': {}
+}
+
+RECIPE = json.dumps([{'name': 'milk', 'color': 'white', 'parts': 1},
+                     {'name': 'coffee', 'color': 'brown', 'parts': 2}])
+
+
+def run(args):
+    from src.api import app
+    from src.database.models import Drink, db, db_drop_and_create_all, drinks_json
+
+    db_drop_and_create_all()
+    for n in range(args.drinks):
+        db.session.add(Drink(title='drink {}'.format(n), recipe=RECIPE))
+    db.session.commit()
+    db.session.remove()
+
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def count(name):
+        with lock:
+            counts[name] += 1
+
+    def request():
+        with app.app_context():
+            try:
+                drinks_json('long')
+                count('reads')
+            except Exception:
+                count('errors')
+            finally:
+                db.session.remove()
+
+    def read():
+        while not stop.is_set():
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join()
+
+    def write(worker):
+        with app.app_context():
+            n = 0
+            while not stop.is_set():
+                try:
+                    drink = Drink(title='writer {} {}'.format(worker, n), recipe=RECIPE)
+                    drink.insert()
+                    drink.title = 'writer {} {} updated'.format(worker, n)
+                    drink.update()
+                    drink.delete()
+                    count('writes')
+                except Exception:
+                    db.session.rollback()
+                    count('errors')
+                finally:
+                    db.session.remove()
+                n += 1
+
+    threads = [threading.Thread(target=read) for _ in range(args.readers)]
+    threads += [threading.Thread(target=write, args=(i,)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({name: value / args.seconds for name, value in counts.items()}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read throughput under concurrent writes.')
+    parser.add_argument('--readers', type=int, default=32)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--drinks', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--config', choices=sorted(CONFIGS))
+    args = parser.parse_args()
+
+    if args.config:
+        run(args)
+        sys.exit()
+
+    print('{:8} {:>10} {:>10} {:>10}'.format('config', 'reads/s', 'writes/s', 'errors/s'))
+    for config, settings in CONFIGS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_FILENAME=os.path.join(directory, 'load.db'), **settings)
+            output = subprocess.run(
+                [sys.executable, __file__, '--config', config] +
+                ['--{}={}'.format(name, getattr(args, name)) for name in ('readers', 'writers', 'drinks', 'seconds')],
+                env=env, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print('{:8} {:10.0f} {:10.0f} {:10.1f}'.format(config, result['reads'], result['writes'], result['errors']))
@@ -1,10 +1,10 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, drinks_json, menu_snapshot, Drink
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
@@ -20,23 +20,43 @@ CORS(app)
 
 ## ROUTES
 '''
-@TODO implement endpoint
-    GET /drinks
-        it should be a public endpoint
-        it should contain only the drink.short() data representation
-    returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
-        or appropriate status code indicating reason for failure
+GET /drinks
+    public endpoint
+    contains only the drink.short() data representation
+returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
+    or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks')
+def get_drinks():
+    # served from the menu snapshot with a strong ETag, so polling
+    # clients that send If-None-Match get an empty 304 until it changes
+    body, etag = menu_snapshot.get()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 '''
-@TODO implement endpoint
-    GET /drinks-detail
-        it should require the 'get:drinks-detail' permission
-        it should contain the drink.long() data representation
-    returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
-        or appropriate status code indicating reason for failure
+GET /drinks-detail
+    requires the 'get:drinks-detail' permission
+    contains the drink.long() data representation
+returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
+    or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks-detail')
+@requires_auth('get:drinks-detail')
+def get_drinks_detail(payload):
+    return drinks_response('long')
+
+
+'''
+drinks_response(form)
+    the list endpoints' body, built from the pre-serialized drinks
+'''
+def drinks_response(form):
+    body = '{"success": true, "drinks": ' + drinks_json(form) + '}'
+    return Response(body, mimetype='application/json')
 
 
 '''
@@ -105,6 +125,12 @@ def unprocessable(error):
 
 
 '''
-@TODO implement error handler for AuthError
-    error handler should conform to general task above 
+error handler for AuthError
 '''
+@app.errorhandler(AuthError)
+def auth_error(error):
+    return jsonify({
+                    "success": False,
+                    "error": error.status_code,
+                    "message": error.error['description']
+                    }), error.status_code
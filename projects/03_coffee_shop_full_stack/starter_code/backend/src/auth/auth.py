@@ -1,4 +1,10 @@
+import copy
+import hashlib
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
@@ -8,6 +14,10 @@ from urllib.request import urlopen
 AUTH0_DOMAIN = 'udacity-fsnd.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'dev'
+JWKS_URL = os.environ.get('JWKS_URL', 'https://{}/.well-known/jwks.json'.format(AUTH0_DOMAIN))
+
+# verified tokens kept by requires_auth, 0 turns the cache off
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
 
 ## AuthError Exception
 '''
@@ -23,64 +33,222 @@ class AuthError(Exception):
 ## Auth Header
 
 '''
-@TODO implement get_token_auth_header() method
-    it should attempt to get the header from the request
-        it should raise an AuthError if no header is present
-    it should attempt to split bearer and the token
-        it should raise an AuthError if the header is malformed
-    return the token part of the header
+get_token_auth_header()
+    gets the header from the request, raises an AuthError if it is
+    missing or not of the form 'Bearer <token>'
+    returns the token part of the header
 '''
 def get_token_auth_header():
-   raise Exception('Not Implemented')
+    auth = request.headers.get('Authorization', None)
+    if not auth:
+        raise AuthError({
+            'code': 'authorization_header_missing',
+            'description': 'Authorization header is expected.'
+        }, 401)
+
+    parts = auth.split()
+    if not parts:
+        raise AuthError({
+            'code': 'authorization_header_missing',
+            'description': 'Authorization header is expected.'
+        }, 401)
+
+    if parts[0].lower() != 'bearer':
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must start with "Bearer".'
+        }, 401)
+
+    elif len(parts) == 1:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Token not found.'
+        }, 401)
+
+    elif len(parts) > 2:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must be bearer token.'
+        }, 401)
+
+    return parts[1]
 
 '''
-@TODO implement check_permissions(permission, payload) method
+VerifiedPayload
+    the decoded jwt payload, plus its permissions as a frozenset
+    computed once when the token is verified
+'''
+class VerifiedPayload(dict):
+    def __init__(self, payload):
+        super().__init__(payload)
+        self.permission_set = frozenset(payload.get('permissions', ()))
+
+'''
+check_permissions(permission, payload)
     @INPUTS
         permission: string permission (i.e. 'post:drink')
         payload: decoded jwt payload
 
-    it should raise an AuthError if permissions are not included in the payload
-        !!NOTE check your RBAC settings in Auth0
-    it should raise an AuthError if the requested permission string is not in the payload permissions array
+    raises an AuthError if the payload has no permissions claim or the
+    requested permission is not in it
     return true otherwise
 '''
 def check_permissions(permission, payload):
-    raise Exception('Not Implemented')
+    if 'permissions' not in payload:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Permissions not included in JWT.'
+        }, 400)
+
+    permissions = getattr(payload, 'permission_set', None)
+    if permissions is None:
+        permissions = frozenset(payload['permissions'])
+    if permission not in permissions:
+        raise AuthError({
+            'code': 'unauthorized',
+            'description': 'Permission not found.'
+        }, 403)
+    return True
+
+'''
+get_jwks()
+    the Auth0 /.well-known/jwks.json key set. only fetched on a
+    token cache miss, see requires_auth
+
+    !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
+'''
+def get_jwks():
+    return json.loads(urlopen(JWKS_URL).read())
 
 '''
-@TODO implement verify_decode_jwt(token) method
+verify_decode_jwt(token)
     @INPUTS
         token: a json web token (string)
 
-    it should be an Auth0 token with key id (kid)
-    it should verify the token using Auth0 /.well-known/jwks.json
-    it should decode the payload from the token
-    it should validate the claims
-    return the decoded payload
-
-    !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
+    verifies an Auth0 token (it must have a key id) against the Auth0 key set,
+    validates the claims and returns the decoded payload
 '''
 def verify_decode_jwt(token):
-    raise Exception('Not Implemented')
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+    except jwt.JWTError:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to parse authentication token.'
+        }, 401)
+    if 'kid' not in unverified_header:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization malformed.'
+        }, 401)
+
+    rsa_key = {}
+    for key in get_jwks()['keys']:
+        if key['kid'] == unverified_header['kid']:
+            rsa_key = {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+    if not rsa_key:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to find the appropriate key.'
+        }, 400)
+
+    try:
+        return jwt.decode(
+            token,
+            rsa_key,
+            algorithms=ALGORITHMS,
+            audience=API_AUDIENCE,
+            issuer='https://' + AUTH0_DOMAIN + '/'
+        )
+
+    except jwt.ExpiredSignatureError:
+        raise AuthError({
+            'code': 'token_expired',
+            'description': 'Token expired.'
+        }, 401)
+
+    except jwt.JWTClaimsError:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Incorrect claims. Please, check the audience and issuer.'
+        }, 401)
+
+    except Exception:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to parse authentication token.'
+        }, 400)
+
+'''
+TokenCache
+    bounded LRU of verified payloads keyed by the sha256 of the token.
+    an entry is dropped once the token's exp has passed
+'''
+class TokenCache:
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is None:
+                return None
+            if payload.get('exp', 0) <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return payload
+
+    def put(self, token, payload):
+        if not self.size or 'exp' not in payload:
+            return
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = payload
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
 
 '''
-@TODO implement @requires_auth(permission) decorator method
+@requires_auth(permission) decorator method
     @INPUTS
         permission: string permission (i.e. 'post:drink')
 
-    it should use the get_token_auth_header method to get the token
-    it should use the verify_decode_jwt method to decode the jwt
-    it should use the check_permissions method validate claims and check the requested permission
-    return the decorator which passes the decoded payload to the decorated method
+    gets the token with get_token_auth_header, verifies it with verify_decode_jwt
+    (or takes the payload from token_cache if this token was verified before),
+    checks the requested permission with check_permissions and passes a
+    copy of the decoded payload to the decorated method, so a view cannot
+    change the cached one
 '''
 def requires_auth(permission=''):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
+            payload = token_cache.get(token)
+            if payload is None:
+                payload = VerifiedPayload(verify_decode_jwt(token))
+                token_cache.put(token, payload)
             check_permissions(permission, payload)
-            return f(payload, *args, **kwargs)
+            return f(copy.deepcopy(dict(payload)), *args, **kwargs)
 
         return wrapper
-    return requires_auth_decorator
\ No newline at end of file
+    return requires_auth_decorator
@@ -1,23 +1,138 @@
+import hashlib
 import os
-from sqlalchemy import Column, String, Integer
+import sqlite3
+import threading
+from sqlalchemy import Column, String, Integer, create_engine, event, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
 from flask_sqlalchemy import SQLAlchemy
 import json
 
-database_filename = "database.db"
+database_filename = os.environ.get('DATABASE_FILENAME', 'database.db')
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
 
+'''
+engine settings, each can be overridden from the environment
+    SQLITE_JOURNAL_MODE  WAL lets readers carry on while a write commits
+    SQLITE_SYNCHRONOUS   NORMAL is durable enough in WAL mode and much faster
+    SQLITE_BUSY_TIMEOUT  milliseconds a writer waits for the lock before failing
+    DB_POOL_SIZE         connections kept open for request handlers, 0 opens
+                         a new connection for every checkout
+    DB_MAX_OVERFLOW      extra connections allowed under load
+    DB_READ_ONLY         set to 0 to send reads through the read/write pool
+'''
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_READ_ONLY = os.environ.get('DB_READ_ONLY', '1') != '0'
+
 db = SQLAlchemy()
 
+# pooled read-only connections to the same file, see setup_db
+read_engine = None
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    file databases get a pooled engine in WAL mode and, unless DB_READ_ONLY
+    is off, a second engine pooling read-only connections to the file
 '''
-def setup_db(app):
+def setup_db(app, database_path=database_path):
+    global read_engine
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(database_path))
     db.app = app
     db.init_app(app)
+    upgrade_db()
+
+    filename = sqlite_filename(database_path)
+    read_engine = None
+    if filename and DB_READ_ONLY:
+        read_engine = create_engine(
+            'sqlite://',
+            creator=lambda: sqlite3.connect('file:{}?mode=ro'.format(filename), uri=True,
+                                            check_same_thread=False),
+            **pool_options())
+
+'''
+upgrade_db()
+    adds the columns the model gained since an existing database.db was
+    created. rows already there keep a NULL short_recipe until they are
+    next saved, drinks_json builds it from recipe meanwhile
+'''
+def upgrade_db():
+    if not db.engine.has_table('drink'):
+        return
+    columns = {column['name'] for column in inspect(db.engine).get_columns('drink')}
+    if 'short_recipe' not in columns:
+        with db.engine.begin() as connection:
+            connection.execute('ALTER TABLE drink ADD COLUMN short_recipe VARCHAR(180)')
+
+'''
+sqlite_filename(database_path)
+    the file behind a sqlite url, or None for other databases and :memory:
+'''
+def sqlite_filename(database_path):
+    url = make_url(database_path)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return url.database
+
+'''
+pool_options()
+    the pool both engines use. connections are checked out and returned per
+    request, so any thread can use any of them, never two at once
+'''
+def pool_options():
+    if DB_POOL_SIZE <= 0:
+        return {'poolclass': NullPool}
+    return {'poolclass': QueuePool, 'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW}
+
+'''
+engine_options(database_path)
+    pool settings for the read/write engine. pysqlite would otherwise open
+    a new connection for every checkout of a file database
+'''
+def engine_options(database_path):
+    options = pool_options()
+    if sqlite_filename(database_path):
+        options['connect_args'] = {'check_same_thread': False}
+    elif make_url(database_path).get_backend_name() == 'sqlite':
+        # a pool of separate :memory: databases would not share tables
+        options = {}
+    return options
+
+'''
+configure_sqlite(dbapi_connection, connection_record)
+    applies the pragmas to every new sqlite connection. journal_mode is
+    persistent and needs write access, read-only connections keep the file's
+'''
+@event.listens_for(Engine, 'connect')
+def configure_sqlite(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA busy_timeout = {:d}'.format(SQLITE_BUSY_TIMEOUT))
+    cursor.execute('PRAGMA synchronous = {}'.format(SQLITE_SYNCHRONOUS))
+    try:
+        cursor.execute('PRAGMA journal_mode = {}'.format(SQLITE_JOURNAL_MODE))
+    except sqlite3.OperationalError:
+        # opened with mode=ro
+        pass
+    cursor.close()
+
+'''
+reader()
+    where list endpoints run their queries: the read-only engine when there
+    is one, otherwise the request's session
+'''
+def reader():
+    return read_engine if read_engine is not None else db.session
 
 '''
 db_drop_and_create_all()
@@ -41,14 +156,27 @@ class Drink(db.Model):
     # the ingredients blob - this stores a lazy json blob
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
     recipe =  Column(String(180), nullable=False)
+    # the short form of recipe, [{'color': string, 'parts':number}]
+    # kept in step with recipe on insert/update so lists never parse json
+    short_recipe = Column(String(180))
+
+    '''
+    parsed_recipe()
+        the recipe blob as python objects, parsed once per recipe value
+    '''
+    def parsed_recipe(self):
+        cached = self.__dict__.get('_parsed_recipe')
+        if cached is None or cached[0] is not self.recipe:
+            cached = (self.recipe, json.loads(self.recipe))
+            self.__dict__['_parsed_recipe'] = cached
+        return cached[1]
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
+        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in self.parsed_recipe()]
         return {
             'id': self.id,
             'title': self.title,
@@ -63,7 +191,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.parsed_recipe()
         }
 
     '''
@@ -78,6 +206,7 @@ class Drink(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        menu_snapshot.invalidate()
 
     '''
     delete()
@@ -90,6 +219,7 @@ class Drink(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        menu_snapshot.invalidate()
 
     '''
     update()
@@ -102,6 +232,71 @@ class Drink(db.Model):
     '''
     def update(self):
         db.session.commit()
+        menu_snapshot.invalidate()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return json.dumps(self.short())
+
+'''
+store_serialized_recipes(mapper, connection, drink)
+    normalizes recipe and fills short_recipe before a drink is written
+'''
+@event.listens_for(Drink, 'before_insert')
+@event.listens_for(Drink, 'before_update')
+def store_serialized_recipes(mapper, connection, drink):
+    recipe = drink.parsed_recipe()
+    drink.recipe = json.dumps(recipe)
+    drink.short_recipe = json.dumps([{'color': r['color'], 'parts': r['parts']} for r in recipe])
+
+'''
+drinks_json(form)
+    every drink as a json array in 'short' or 'long' form, assembled from
+    the stored recipe strings instead of parsing and re-encoding them
+'''
+def drinks_json(form='short'):
+    column = Drink.short_recipe if form == 'short' else Drink.recipe
+    rows = reader().execute(
+        select([Drink.id, Drink.title, column.label('stored'), Drink.recipe]).order_by(Drink.id))
+    drinks = []
+    for id, title, stored, recipe in rows:
+        if stored is None:
+            # written before short_recipe existed
+            stored = json.dumps([{'color': r['color'], 'parts': r['parts']} for r in json.loads(recipe)])
+        drinks.append('{"id": %d, "title": %s, "recipe": %s}' % (id, json.dumps(title), stored))
+    return '[' + ', '.join(drinks) + ']'
+
+'''
+MenuSnapshot
+    the GET /drinks body and its strong ETag. built on first use and
+    thrown away whenever Drink.insert(), update() or delete() commit
+'''
+class MenuSnapshot:
+    def __init__(self, form='short'):
+        self.form = form
+        self.snapshot = None
+        # bumped by every invalidate(), a rebuild that started under an
+        # older generation may have read the menu before the write
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.state_lock = threading.Lock()
+
+    def get(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is None:
+                    generation = self.generation
+                    body = ('{"success": true, "drinks": ' + drinks_json(self.form) + '}').encode()
+                    snapshot = (body, hashlib.sha256(body).hexdigest())
+                    with self.state_lock:
+                        if generation == self.generation:
+                            self.snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        with self.state_lock:
+            self.generation += 1
+            self.snapshot = None
+
+menu_snapshot = MenuSnapshot()